@@ -1,13 +1,13 @@
 import os
 from app_package import create_app
-from flask import send_from_directory
+from app_package.services.media import serve_upload
 
 app = create_app()
 
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return serve_upload(filename)
 
 
 if __name__ == '__main__':
@@ -16,6 +16,8 @@ if __name__ == '__main__':
         pass  # reloader parent — skip scheduler
     else:
         from scheduler import init_scheduler
+        from worker import start_worker_thread
         init_scheduler(app)
+        start_worker_thread(app)
 
     app.run(host='0.0.0.0', port=8090, debug=True)
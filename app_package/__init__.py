@@ -31,6 +31,8 @@ def create_app():
     from app_package.routes.prospecting import prospecting_bp
     from app_package.routes.ai_insights import ai_insights_bp
     from app_package.routes.daily_tasks import daily_tasks_bp
+    from app_package.routes.webhooks import webhooks_bp
+    from app_package.routes.search import search_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
@@ -43,10 +45,47 @@ def create_app():
     app.register_blueprint(prospecting_bp)
     app.register_blueprint(ai_insights_bp)
     app.register_blueprint(daily_tasks_bp)
+    app.register_blueprint(webhooks_bp)
+    app.register_blueprint(search_bp)
 
     # Create tables
     with app.app_context():
         from app_package import models  # noqa: F401
         db.create_all()
+        _add_missing_columns()
+        from app_package.services import search
+        search.ensure_index()
 
     return app
+
+
+# Data fixes run once, right after a column is added to an existing table
+BACKFILLS = {
+    ('comments', 'platform'): [
+        'UPDATE comments SET platform = '
+        '(SELECT platform FROM post_results WHERE post_results.id = comments.post_result_id)',
+        # Keep the oldest copy of comments fetched twice, so the unique index can be built
+        'DELETE FROM comments WHERE platform_comment_id IS NOT NULL AND id NOT IN '
+        '(SELECT MIN(id) FROM comments GROUP BY platform, platform_comment_id)',
+    ],
+}
+
+
+def _add_missing_columns():
+    """db.create_all() never alters existing tables — add columns and indexes introduced since."""
+    from sqlalchemy import inspect, text
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            have = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in have:
+                    col_type = column.type.compile(dialect=db.engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                    for statement in BACKFILLS.get((table.name, column.name), []):
+                        conn.execute(text(statement))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -98,6 +98,7 @@ class Post(db.Model):
                            onupdate=lambda: datetime.now(timezone.utc))
 
     results = db.relationship('PostResult', backref='post', lazy=True, cascade='all, delete-orphan')
+    ledger = db.relationship('PublishLedger', lazy=True, cascade='all, delete-orphan')
 
     def get_platform_ids(self):
         return json.loads(self.platforms) if self.platforms else []
@@ -105,6 +106,11 @@ class Post(db.Model):
     def set_platform_ids(self, ids):
         self.platforms = json.dumps(ids)
 
+    @property
+    def is_video(self):
+        from app_package.services.media import is_video
+        return bool(self.image) and is_video(self.image)
+
     @property
     def status_color(self):
         colors = {
@@ -131,8 +137,59 @@ class PostResult(db.Model):
     comments_count = db.Column(db.Integer, default=0)
     shares_count = db.Column(db.Integer, default=0)
     published_at = db.Column(db.DateTime)
+    metrics_refreshed_at = db.Column(db.DateTime)  # last time the counters above were read from the platform
 
     comments = db.relationship('Comment', backref='post_result', lazy=True, cascade='all, delete-orphan')
+    sync_state = db.relationship('CommentSyncState', uselist=False, lazy=True, cascade='all, delete-orphan')
+    snapshots = db.relationship('EngagementSnapshot', lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (
+        # Metrics refresher: recently published successful results
+        db.Index('ix_post_results_status_published_at', 'status', 'published_at'),
+    )
+
+
+class PublishJob(db.Model):
+    __tablename__ = 'publish_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    locked_by = db.Column(db.String(120))
+    locked_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    lease_expires_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime)
+
+    post = db.relationship('Post', backref=db.backref('publish_jobs', lazy=True, cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_publish_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+
+class PublishLedger(db.Model):
+    """Idempotency record of publishing one version of a post to one account."""
+    __tablename__ = 'publish_ledger'
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
+    social_account_id = db.Column(db.Integer, db.ForeignKey('social_accounts.id'), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of text + image bytes
+    status = db.Column(db.String(20), nullable=False, default='in_flight')  # in_flight / success / failed
+    platform_post_id = db.Column(db.String(300))
+    locked_by = db.Column(db.String(120))  # publish worker holding an in-flight entry
+    lease_expires_at = db.Column(db.DateTime)  # in-flight entries are retried once this passes
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'social_account_id', 'content_hash', name='uq_publish_ledger_key'),
+    )
 
 
 class Comment(db.Model):
@@ -140,6 +197,7 @@ class Comment(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     post_result_id = db.Column(db.Integer, db.ForeignKey('post_results.id'), nullable=False)
+    platform = db.Column(db.String(20))
     platform_comment_id = db.Column(db.String(300))
     author_name = db.Column(db.String(200))
     author_image = db.Column(db.String(500))
@@ -151,6 +209,48 @@ class Comment(db.Model):
 
     replies = db.relationship('Comment', backref=db.backref('parent', remote_side='Comment.id'), lazy=True)
 
+    __table_args__ = (
+        db.Index('uq_comments_platform_comment', 'platform', 'platform_comment_id', unique=True),
+        # Inbox keyset pagination, newest first, optionally per platform
+        db.Index('ix_comments_created_at_id', 'created_at', 'id'),
+        db.Index('ix_comments_platform_created_at_id', 'platform', 'created_at', 'id'),
+    )
+
+
+class CommentSyncState(db.Model):
+    """How far comment sync has read a published post's comments."""
+    __tablename__ = 'comment_sync_states'
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_result_id = db.Column(db.Integer, db.ForeignKey('post_results.id'), nullable=False, unique=True)
+    cursor = db.Column(db.Text)  # paging cursor of an interrupted walk, resumed next sync
+    last_seen_at = db.Column(db.DateTime)  # created_time of the newest comment synced
+    last_synced_at = db.Column(db.DateTime)
+
+
+class EngagementSnapshot(db.Model):
+    """A post's engagement counters at one point in time; rollups keep the last sample of their hour/day."""
+    __tablename__ = 'engagement_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_result_id = db.Column(db.Integer, db.ForeignKey('post_results.id'), nullable=False)
+    social_account_id = db.Column(db.Integer, db.ForeignKey('social_accounts.id'), nullable=False)
+    captured_at = db.Column(db.DateTime, nullable=False)  # rollups: when their last sample was captured
+    granularity = db.Column(db.String(10), nullable=False, default='raw')  # raw / hour / day
+    likes = db.Column(db.Integer)
+    comments = db.Column(db.Integer)
+    shares = db.Column(db.Integer)
+    impressions = db.Column(db.Integer)
+    reach = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('uq_engagement_snapshots_key', 'post_result_id', 'granularity', 'captured_at', unique=True),
+        # Per-account range queries (trend charts)
+        db.Index('ix_engagement_snapshots_account_captured', 'social_account_id', 'captured_at'),
+        # Compaction and retention
+        db.Index('ix_engagement_snapshots_granularity_captured', 'granularity', 'captured_at'),
+    )
+
 
 class TaskTemplate(db.Model):
     __tablename__ = 'task_templates'
@@ -226,6 +326,105 @@ class TaskAssignment(db.Model):
     )
 
 
+class RateLimitState(db.Model):
+    """Platform usage shared between processes by the rate limiter."""
+    __tablename__ = 'rate_limit_states'
+
+    platform = db.Column(db.String(20), primary_key=True)  # meta / linkedin
+    bucket_key = db.Column(db.String(64), primary_key=True)  # 'app' or hashed account token
+    usage_pct = db.Column(db.Float, default=0)
+    blocked_until = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class JobLock(db.Model):
+    """Lease on a background job, so only one scheduler process runs it at a time (SQLite)."""
+    __tablename__ = 'job_locks'
+
+    name = db.Column(db.String(100), primary_key=True)
+    locked_by = db.Column(db.String(120))
+    lease_expires_at = db.Column(db.DateTime)
+
+
+class LinkedInAsset(db.Model):
+    """A registered LinkedIn image asset, reusable by the same owner for the same image."""
+    __tablename__ = 'linkedin_assets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_hash = db.Column(db.String(64), nullable=False)
+    owner_urn = db.Column(db.String(100), nullable=False)
+    asset_urn = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.UniqueConstraint('image_hash', 'owner_urn', name='uq_linkedin_assets_image_owner'),
+    )
+
+    @staticmethod
+    def lookup(image_hash, owner_urn):
+        row = db.session.query(LinkedInAsset).filter_by(image_hash=image_hash, owner_urn=owner_urn).first()
+        return row.asset_urn if row else None
+
+    @staticmethod
+    def store(image_hash, owner_urn, asset_urn):
+        row = db.session.query(LinkedInAsset).filter_by(image_hash=image_hash, owner_urn=owner_urn).first()
+        if row:
+            row.asset_urn = asset_urn
+            row.created_at = datetime.now(timezone.utc)
+        else:
+            db.session.add(LinkedInAsset(image_hash=image_hash, owner_urn=owner_urn, asset_urn=asset_urn))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()  # another publisher cached the same image first
+
+    @staticmethod
+    def invalidate(image_hash, owner_urn):
+        db.session.query(LinkedInAsset).filter_by(image_hash=image_hash, owner_urn=owner_urn).delete()
+        db.session.commit()
+
+
+class MediaUpload(db.Model):
+    """Progress of a chunked video upload, so a retry resumes instead of starting over."""
+    __tablename__ = 'media_uploads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    platform = db.Column(db.String(20), nullable=False)
+    owner = db.Column(db.String(100), nullable=False)  # FB page id / LinkedIn author URN
+    file_hash = db.Column(db.String(64), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=False)
+    session_id = db.Column(db.String(200))  # FB upload_session_id / LinkedIn video URN
+    video_id = db.Column(db.String(100))  # FB video id
+    upload_token = db.Column(db.Text)  # LinkedIn finalizeUpload token
+    offset = db.Column(db.BigInteger, default=0)  # FB: next byte the session expects
+    parts = db.Column(db.Text)  # LinkedIn: JSON list of {url, first, last, etag}
+    status = db.Column(db.String(20), default='uploading')  # uploading / finalized
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.UniqueConstraint('platform', 'owner', 'file_hash', name='uq_media_uploads_key'),
+    )
+
+    def get_parts(self):
+        return json.loads(self.parts) if self.parts else []
+
+    def set_parts(self, parts):
+        self.parts = json.dumps(parts)
+
+    @staticmethod
+    def find(platform, owner, file_hash):
+        return db.session.query(MediaUpload).filter_by(
+            platform=platform, owner=owner, file_hash=file_hash).first()
+
+    @staticmethod
+    def discard(platform, owner, file_hash):
+        db.session.query(MediaUpload).filter_by(
+            platform=platform, owner=owner, file_hash=file_hash).delete()
+        db.session.commit()
+
+
 class AppSetting(db.Model):
     __tablename__ = 'app_settings'
 
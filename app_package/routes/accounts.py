@@ -92,14 +92,16 @@ def callback_instagram():
         user_token = fb_svc.exchange_code(code, redirect_uri)
         pages = fb_svc.get_pages(user_token)
         connected = 0
+        # One ?ids= lookup returns every Page's linked IG profile
+        profiles = ig_svc.get_ig_accounts_for_pages([page['id'] for page in pages], user_token)
         for page in pages:
-            ig_id = ig_svc.get_ig_account_from_page(page['id'], page['access_token'])
-            if not ig_id:
+            profile = profiles.get(page['id'])
+            if not profile:
                 continue
+            ig_id = profile['id']
             existing = db.session.query(SocialAccount).filter_by(
                 platform='instagram', platform_account_id=ig_id
             ).first()
-            profile = ig_svc.get_ig_profile(ig_id, page['access_token'])
             if existing:
                 existing.access_token = page['access_token']
                 existing.account_name = profile.get('username', profile.get('name', ''))
@@ -210,12 +212,17 @@ def callback_linkedin():
 @accounts_bp.route('/disconnect/<int:account_id>', methods=['POST'])
 @login_required
 def disconnect(account_id):
-    from app_package.models import PostResult
+    from app_package.models import PostResult, PublishLedger, CommentSyncState, EngagementSnapshot
     account = db.session.get(SocialAccount, account_id)
     if account:
         name = account.account_name
         # Delete linked post results first to avoid FK constraint
+        result_ids = db.session.query(PostResult.id).filter_by(social_account_id=account.id)
+        db.session.query(CommentSyncState).filter(
+            CommentSyncState.post_result_id.in_(result_ids.scalar_subquery())).delete(synchronize_session=False)
+        db.session.query(EngagementSnapshot).filter_by(social_account_id=account.id).delete()
         db.session.query(PostResult).filter_by(social_account_id=account.id).delete()
+        db.session.query(PublishLedger).filter_by(social_account_id=account.id).delete()
         db.session.delete(account)
         db.session.commit()
         flash(f'Disconnected and removed {name}.', 'info')
@@ -1,86 +1,83 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
 from app_package import db
-from app_package.models import PostResult, Comment, SocialAccount
-from app_package.services import facebook as fb_svc, instagram as ig_svc, linkedin as li_svc
+from app_package.models import Comment, SocialAccount
+from app_package.services import comment_sync, facebook as fb_svc, instagram as ig_svc, linkedin as li_svc
 
 comments_bp = Blueprint('comments', __name__, url_prefix='/comments')
 
 
+INBOX_PAGE_SIZE = 50
+
+
+def _encode_cursor(comment):
+    return f'{comment.created_at.isoformat()}_{comment.id}'
+
+
+def _decode_cursor(cursor):
+    try:
+        created_at, comment_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(comment_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _inbox_page(platform_filter, cursor):
+    """One page of the inbox, newest first, keyset-paginated on (created_at, id).
+
+    Returns (comments, next_cursor); next_cursor is None on the last page.
+    """
+    query = db.session.query(Comment).options(joinedload(Comment.post_result))
+    if platform_filter:
+        query = query.filter(Comment.platform == platform_filter)
+    position = _decode_cursor(cursor) if cursor else None
+    if position:
+        query = query.filter(tuple_(Comment.created_at, Comment.id) < position)
+    comments = query.order_by(Comment.created_at.desc(), Comment.id.desc()).limit(INBOX_PAGE_SIZE + 1).all()
+    next_cursor = _encode_cursor(comments[INBOX_PAGE_SIZE - 1]) if len(comments) > INBOX_PAGE_SIZE else None
+    return comments[:INBOX_PAGE_SIZE], next_cursor
+
+
 @comments_bp.route('/')
 @login_required
 def inbox():
     platform_filter = request.args.get('platform', '')
-    query = db.session.query(Comment).join(PostResult)
-    if platform_filter:
-        query = query.filter(PostResult.platform == platform_filter)
-    comments = query.order_by(Comment.created_at.desc()).all()
-    return render_template('comments/inbox.html', comments=comments, platform_filter=platform_filter)
+    comments, next_cursor = _inbox_page(platform_filter, request.args.get('cursor'))
+    return render_template('comments/inbox.html', comments=comments, platform_filter=platform_filter,
+                           next_cursor=next_cursor)
+
+
+@comments_bp.route('/page.json')
+@login_required
+def inbox_json():
+    """The inbox as JSON for infinite scroll: comments, their rendered HTML and the next cursor."""
+    platform_filter = request.args.get('platform', '')
+    comments, next_cursor = _inbox_page(platform_filter, request.args.get('cursor'))
+    return jsonify({
+        'comments': [{
+            'id': c.id,
+            'platform': c.platform,
+            'author_name': c.author_name,
+            'content': c.content,
+            'replied': c.replied,
+            'reply_content': c.reply_content,
+            'created_at': c.created_at.isoformat() if c.created_at else None,
+            'post_id': c.post_result.post_id if c.post_result else None,
+        } for c in comments],
+        'html': render_template('comments/_comment.html', comments=comments),
+        'next_cursor': next_cursor,
+    })
 
 
 @comments_bp.route('/fetch', methods=['POST'])
 @login_required
 def fetch_comments():
-    """Fetch latest comments from all platforms for all published posts."""
-    results = db.session.query(PostResult).filter_by(status='success').all()
-    count = 0
-    for result in results:
-        account = db.session.get(SocialAccount, result.social_account_id)
-        if not account or not account.is_active or not result.platform_post_id:
-            continue
-        try:
-            if result.platform == 'facebook':
-                api_comments = fb_svc.get_post_comments(result.platform_post_id, account.access_token)
-                for c in api_comments:
-                    existing = db.session.query(Comment).filter_by(
-                        platform_comment_id=c['id']).first()
-                    if not existing:
-                        comment = Comment(
-                            post_result_id=result.id,
-                            platform_comment_id=c['id'],
-                            author_name=c.get('from', {}).get('name', 'Unknown'),
-                            content=c.get('message', ''),
-                        )
-                        db.session.add(comment)
-                        count += 1
-
-            elif result.platform == 'instagram':
-                api_comments = ig_svc.get_media_comments(result.platform_post_id, account.access_token)
-                for c in api_comments:
-                    existing = db.session.query(Comment).filter_by(
-                        platform_comment_id=c['id']).first()
-                    if not existing:
-                        comment = Comment(
-                            post_result_id=result.id,
-                            platform_comment_id=c['id'],
-                            author_name=c.get('username', 'Unknown'),
-                            content=c.get('text', ''),
-                        )
-                        db.session.add(comment)
-                        count += 1
-
-            elif result.platform == 'linkedin':
-                api_comments = li_svc.get_post_comments(result.platform_post_id, account.access_token)
-                for c in api_comments:
-                    cid = c.get('$URN', c.get('id', ''))
-                    existing = db.session.query(Comment).filter_by(
-                        platform_comment_id=str(cid)).first()
-                    if not existing:
-                        actor = c.get('actor~', {})
-                        comment = Comment(
-                            post_result_id=result.id,
-                            platform_comment_id=str(cid),
-                            author_name=actor.get('localizedFirstName', '') + ' ' + actor.get('localizedLastName', ''),
-                            content=c.get('message', {}).get('text', '') if isinstance(c.get('message'), dict) else str(c.get('message', '')),
-                        )
-                        db.session.add(comment)
-                        count += 1
-
-        except Exception:
-            continue
-
-    db.session.commit()
-    flash(f'Fetched {count} new comment(s).', 'success')
+    """Ask the background comment sync to poll every active post now."""
+    comment_sync.request_sync()
+    flash('Comment sync requested — new comments will appear here shortly.', 'info')
     return redirect(url_for('comments.inbox'))
 
 
@@ -1,16 +1,16 @@
-import os
-import uuid
 from datetime import datetime, timezone
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from app_package import db
-from app_package.models import SocialAccount, Post, PostResult
-from app_package.services import facebook as fb_svc, instagram as ig_svc, linkedin as li_svc
+from app_package.models import SocialAccount, Post
+from app_package.services import media
+from app_package.services.deadlines import notify_scheduled
+from app_package.services.job_queue import enqueue_publish
 
 compose_bp = Blueprint('compose', __name__, url_prefix='/compose')
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'} | media.VIDEO_EXTENSIONS
 
 
 def allowed_file(filename):
@@ -36,14 +36,16 @@ def compose():
             flash('Select at least one account to publish to.', 'danger')
             return redirect(url_for('compose.compose'))
 
-        # Handle image upload
+        # Handle image / video upload
         image_path = None
         file = request.files.get('image')
         if file and file.filename and allowed_file(file.filename):
             ext = file.filename.rsplit('.', 1)[1].lower()
-            filename = f'{uuid.uuid4().hex}.{ext}'
-            image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(image_path)
+            image_path = media.store_upload(file, ext)
+            try:
+                media.prepare_variants(image_path)
+            except Exception as e:
+                print(f'[Compose] image variants failed, publishing will use the original: {e}')
 
         # Create post record
         post = Post(
@@ -75,88 +77,19 @@ def compose():
                 post.status = 'scheduled'
                 db.session.add(post)
                 db.session.commit()
+                notify_scheduled(post)
                 flash(f'Post scheduled for {scheduled_at.strftime("%b %d, %Y %H:%M")} UTC.', 'success')
                 return redirect(url_for('posts.list_posts'))
             else:
                 flash('Please select a date and time for scheduling.', 'danger')
                 return redirect(url_for('compose.compose'))
 
-        # Publish now
+        # Publish now — a worker picks the job up; the request returns at once
         post.status = 'publishing'
         db.session.add(post)
+        enqueue_publish(post)
         db.session.commit()
-
-        publish_post(post)
+        flash('Post queued for publishing.', 'info')
         return redirect(url_for('posts.detail', post_id=post.id))
 
     return render_template('compose/compose.html', accounts=accounts)
-
-
-def publish_post(post):
-    """Publish a post to all selected platforms."""
-    account_ids = post.get_platform_ids()
-    any_success = False
-
-    for acc_id in account_ids:
-        account = db.session.get(SocialAccount, acc_id)
-        if not account or not account.is_active:
-            continue
-
-        result = PostResult(
-            post_id=post.id,
-            social_account_id=account.id,
-            platform=account.platform,
-        )
-
-        try:
-            platform_post_id = None
-
-            if account.platform == 'facebook':
-                if post.image:
-                    platform_post_id = fb_svc.publish_photo(
-                        account.page_id, account.access_token, post.content, post.image)
-                else:
-                    platform_post_id = fb_svc.publish_text(
-                        account.page_id, account.access_token, post.content)
-
-            elif account.platform == 'instagram':
-                if post.image:
-                    # IG requires a public image URL; for local dev use the BASE_URL
-                    image_url = current_app.config['BASE_URL'] + '/uploads/' + os.path.basename(post.image)
-                    ig_user_id = account.get_extra('ig_user_id') or account.platform_account_id
-                    platform_post_id = ig_svc.publish_photo(
-                        ig_user_id, account.access_token, image_url, post.content)
-                else:
-                    result.status = 'failed'
-                    result.error_message = 'Instagram requires an image to publish.'
-                    db.session.add(result)
-                    continue
-
-            elif account.platform == 'linkedin':
-                org_urn = account.get_extra('org_urn') or f'urn:li:person:{account.platform_account_id}'
-                if post.image:
-                    platform_post_id = li_svc.publish_image(
-                        org_urn, account.access_token, post.content, post.image)
-                else:
-                    platform_post_id = li_svc.publish_text(
-                        org_urn, account.access_token, post.content)
-
-            result.platform_post_id = platform_post_id
-            result.status = 'success'
-            result.published_at = datetime.now(timezone.utc)
-            any_success = True
-
-        except Exception as e:
-            result.status = 'failed'
-            result.error_message = str(e)
-
-        db.session.add(result)
-
-    post.status = 'published' if any_success else 'failed'
-    post.published_at = datetime.now(timezone.utc) if any_success else None
-    db.session.commit()
-
-    if any_success:
-        flash('Post published successfully!', 'success')
-    else:
-        flash('Post publishing failed on all platforms.', 'danger')
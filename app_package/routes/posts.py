@@ -10,11 +10,14 @@ from app_package.models import Post, PostResult, SocialAccount
 
 
 def _post_urls(post):
-    """Return (base_url, image_url, clean_text, preview_url) for a post."""
+    """Return (base_url, image_url, clean_text, preview_url) for a post.
+
+    image_url is None for video posts, which have no picture to preview or share.
+    """
     base = current_app.config['BASE_URL'].rstrip('/')
     clean_text = re.sub(r'<[^>]+>', '', post.content).strip()
     image_url = None
-    if post.image:
+    if post.image and not post.is_video:
         fname = post.image.replace('\\', '/').split('/')[-1]
         image_url = base + url_for('uploaded_file', filename=fname)
     preview_url = base + url_for('posts.preview', post_id=post.id)
@@ -63,10 +66,11 @@ def republish(post_id):
             db.session.delete(r)
     db.session.commit()
 
-    from app_package.routes.compose import publish_post
+    from app_package.services.job_queue import enqueue_publish
     post.status = 'publishing'
+    enqueue_publish(post)
     db.session.commit()
-    publish_post(post)
+    flash('Post queued for publishing.', 'info')
     return redirect(url_for('posts.detail', post_id=post.id))
 
 
@@ -83,57 +87,22 @@ def share_to_account(post_id, account_id):
         flash('Account not found or inactive.', 'danger')
         return redirect(url_for('posts.detail', post_id=post.id))
 
-    from app_package.routes.compose import publish_post
-    import os
-    from datetime import datetime, timezone
-    from app_package.services import facebook as fb_svc, instagram as ig_svc, linkedin as li_svc
-
-    result = PostResult(
-        post_id=post.id,
-        social_account_id=account.id,
-        platform=account.platform,
-    )
-    try:
-        platform_post_id = None
-        if account.platform == 'facebook':
-            if post.image:
-                platform_post_id = fb_svc.publish_photo(
-                    account.page_id, account.access_token, post.content, post.image)
-            else:
-                platform_post_id = fb_svc.publish_text(
-                    account.page_id, account.access_token, post.content)
-        elif account.platform == 'instagram':
-            if post.image:
-                image_url = current_app.config['BASE_URL'] + '/uploads/' + os.path.basename(post.image)
-                ig_user_id = account.get_extra('ig_user_id') or account.platform_account_id
-                platform_post_id = ig_svc.publish_photo(
-                    ig_user_id, account.access_token, image_url, post.content)
-            else:
-                flash('Instagram requires an image to publish.', 'danger')
-                return redirect(url_for('posts.detail', post_id=post.id))
-        elif account.platform == 'linkedin':
-            org_urn = account.get_extra('org_urn') or f'urn:li:person:{account.platform_account_id}'
-            if post.image:
-                platform_post_id = li_svc.publish_image(
-                    org_urn, account.access_token, post.content, post.image)
-            else:
-                platform_post_id = li_svc.publish_text(
-                    org_urn, account.access_token, post.content)
-
-        result.platform_post_id = platform_post_id
-        result.status = 'success'
-        result.published_at = datetime.now(timezone.utc)
+    from app_package.services import publisher
+
+    if account.platform == 'instagram' and not post.image:
+        flash('Instagram requires an image to publish.', 'danger')
+        return redirect(url_for('posts.detail', post_id=post.id))
+
+    # Only a draft is promoted by sharing; scheduled and publishing posts
+    # keep their status so the full publish still runs.
+    outcome = publisher.publish_post(post, account_ids=[account.id],
+                                     update_status=post.status == 'draft')
+    if outcome['success']:
         flash(f'Published to {account.account_name}!', 'success')
-    except Exception as e:
-        result.status = 'failed'
-        result.error_message = str(e)
-        flash(f'Failed to publish to {account.account_name}: {e}', 'danger')
-
-    db.session.add(result)
-    if post.status == 'draft':
-        post.status = 'published'
-        post.published_at = datetime.now(timezone.utc)
-    db.session.commit()
+    elif outcome['failed']:
+        flash(f'Failed to publish to {account.account_name}: {outcome["failed"][0]["error"]}', 'danger')
+    else:
+        flash(f'Already published to {account.account_name}.', 'info')
     return redirect(url_for('posts.detail', post_id=post.id))
 
 
@@ -0,0 +1,61 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from sqlalchemy.orm import joinedload
+from app_package import db
+from app_package.models import Comment, Post
+from app_package.services import search as search_svc
+
+search_bp = Blueprint('search', __name__, url_prefix='/search')
+
+
+def _comment_hit(comment):
+    return {
+        'type': 'comment',
+        'id': comment.id,
+        'platform': comment.platform,
+        'author_name': comment.author_name,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat() if comment.created_at else None,
+        'post_id': comment.post_result.post_id if comment.post_result else None,
+    }
+
+
+def _post_hit(post):
+    return {
+        'type': 'post',
+        'id': post.id,
+        'content': post.content,
+        'status': post.status,
+        'created_at': post.created_at.isoformat() if post.created_at else None,
+    }
+
+
+@search_bp.route('/api')
+@login_required
+def api():
+    """Ranked full-text search: ?q=...&type=comments|posts&page=1&per_page=20."""
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'comments')
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if kind not in search_svc.KINDS:
+        return jsonify({'error': f"type must be one of {', '.join(search_svc.KINDS)}"}), 400
+
+    result = search_svc.search(query, kind,
+                               page=request.args.get('page', 1, type=int),
+                               per_page=request.args.get('per_page', 20, type=int))
+    ids = [hit['id'] for hit in result['hits']]
+    if kind == 'comments':
+        rows = db.session.query(Comment).options(joinedload(Comment.post_result)).filter(Comment.id.in_(ids)).all()
+        describe = _comment_hit
+    else:
+        rows = db.session.query(Post).filter(Post.id.in_(ids)).all()
+        describe = _post_hit
+    by_id = {row.id: row for row in rows}
+    result['hits'] = [
+        dict(describe(by_id[hit['id']]), score=hit['score'], snippet=hit['snippet'])
+        for hit in result['hits'] if hit['id'] in by_id
+    ]
+    result['q'] = query
+    result['type'] = kind
+    return jsonify(result)
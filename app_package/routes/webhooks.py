@@ -0,0 +1,39 @@
+import hashlib
+import hmac
+from flask import Blueprint, request, current_app, abort
+from app_package.services import comment_sync
+
+webhooks_bp = Blueprint('webhooks', __name__, url_prefix='/webhooks')
+
+
+def _valid_signature(body, header):
+    """Check X-Hub-Signature-256 (HMAC-SHA256 of the raw body, keyed with the app secret)."""
+    secret = current_app.config['META_APP_SECRET']
+    if not secret or not header or not header.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header[len('sha256='):])
+
+
+@webhooks_bp.route('/meta', methods=['GET'])
+def meta_verify():
+    """Subscription handshake: echo hub.challenge when the verify token matches."""
+    token = current_app.config['META_WEBHOOK_VERIFY_TOKEN']
+    if (request.args.get('hub.mode') == 'subscribe' and token
+            and hmac.compare_digest(request.args.get('hub.verify_token', ''), token)):
+        return request.args.get('hub.challenge', ''), 200
+    abort(403)
+
+
+@webhooks_bp.route('/meta', methods=['POST'])
+def meta_event():
+    """Page `feed` and Instagram `comments` change notifications."""
+    if not _valid_signature(request.get_data(), request.headers.get('X-Hub-Signature-256')):
+        abort(403)
+    payload = request.get_json(silent=True) or {}
+    try:
+        comment_sync.ingest_webhook(payload)
+    except Exception as e:
+        # Meta retries non-200 deliveries for hours; polling will pick up anything lost
+        print(f'[Webhook] could not ingest Meta event: {e}')
+    return 'OK', 200
@@ -0,0 +1,97 @@
+"""Atomic row claiming shared by the scheduler and the publish workers.
+
+On Postgres candidates are selected with ``FOR UPDATE SKIP LOCKED`` so
+concurrent claimers never block on, or double-claim, the same row. SQLite
+has no row locks but serializes writers, so there each candidate is taken
+with a conditional UPDATE that re-checks the claim criterion.
+
+job_lock() keeps a periodic background job to one scheduler process at a
+time: a session-level advisory lock on Postgres, a leased JobLock row
+elsewhere.
+"""
+import hashlib
+import os
+import socket
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import or_, text, update
+from app_package import db
+from app_package.models import JobLock
+from app_package.services.sql import insert
+
+# How long a JobLock row is held if its process dies without releasing it
+JOB_LOCK_LEASE_SECONDS = 3600
+
+
+def worker_id():
+    """Identify this process in job and row locks."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(model, criterion, values, order_by=(), limit=1):
+    """Claim up to `limit` rows of `model` matching `criterion`.
+
+    `values` is applied to every claimed row. Returns the claimed primary
+    keys. The caller commits, so anything written alongside the claim
+    (e.g. an enqueued job) lands in the same transaction.
+    """
+    query = db.session.query(model.id).filter(criterion).order_by(*order_by).limit(limit)
+
+    if db.engine.dialect.name == 'postgresql':
+        ids = [row[0] for row in query.with_for_update(skip_locked=True).all()]
+        if ids:
+            db.session.query(model).filter(model.id.in_(ids)).update(
+                values, synchronize_session=False)
+        return ids
+
+    claimed = []
+    for (row_id,) in query.all():
+        updated = db.session.query(model).filter(model.id == row_id, criterion).update(
+            values, synchronize_session=False)
+        if updated:
+            claimed.append(row_id)
+    return claimed
+
+
+def _advisory_key(name):
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], 'big', signed=True)
+
+
+@contextmanager
+def job_lock(name, lease_seconds=JOB_LOCK_LEASE_SECONDS):
+    """Yield True if this process got the lock for job `name`, False if another holds it.
+
+    The lock is released when the block exits.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        key = _advisory_key(name)
+        with db.engine.connect() as conn:
+            acquired = conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': key}).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': key})
+                conn.commit()
+        return
+
+    owner = worker_id()
+    now = datetime.now(timezone.utc)
+    with db.engine.begin() as conn:
+        conn.execute(insert(JobLock.__table__).values(name=name).on_conflict_do_nothing(index_elements=['name']))
+        acquired = conn.execute(
+            update(JobLock)
+            .where(JobLock.name == name,
+                   or_(JobLock.lease_expires_at.is_(None), JobLock.lease_expires_at < now))
+            .values(locked_by=owner, lease_expires_at=now + timedelta(seconds=lease_seconds))
+        ).rowcount == 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(JobLock)
+                    .where(JobLock.name == name, JobLock.locked_by == owner)
+                    .values(locked_by=None, lease_expires_at=None)
+                )
@@ -0,0 +1,381 @@
+"""Concurrent, incremental comment sync for published posts.
+
+Each PostResult has a CommentSyncState with the created_time of the newest
+comment synced. On Facebook and Instagram a sync reads the comment edge
+newest first, one page at a time, and stops at the first page reaching that
+point, so its cost follows new activity rather than a post's lifetime
+comment count. If a walk is interrupted, the cursor of the next page is
+kept and the following sync resumes from there. First pages are fetched in
+one Graph batch per account. LinkedIn returns a single page.
+
+Posts are fetched concurrently (COMMENT_SYNC_MAX_WORKERS threads), with at
+most COMMENT_SYNC_PER_PLATFORM calls in flight per platform and
+COMMENT_SYNC_PER_TOKEN per access token. Fetch threads only see plain
+dicts; the calling thread ingests each post's comments with bulk_ingest as
+soon as it arrives, and one post failing never affects the others.
+
+In production the scheduler runs run_background_sync() every
+COMMENT_SYNC_TICK_SECONDS. How often a post is polled depends on how
+recently it saw activity (published, or its newest comment): see
+POLL_TIERS. Posts quiet for longer than the last tier are not polled.
+When Meta webhooks are configured, new Facebook/Instagram comments arrive
+through ingest_webhook() within seconds and polling those platforms drops
+to a fallback, COMMENT_SYNC_WEBHOOK_SLOWDOWN times less often.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from app_package import db
+from app_package.models import AppSetting, Comment, CommentSyncState, PostResult, SocialAccount
+from app_package.services import facebook as fb_svc, instagram as ig_svc, linkedin as li_svc
+from app_package.services.sql import as_utc, insert
+
+SYNCED_PLATFORMS = ('facebook', 'instagram', 'linkedin')
+# Platforms whose comment edges are Graph-paged (and batched)
+PAGED_PLATFORMS = ('facebook', 'instagram')
+# (last activity within, poll at most every) — hot posts often, older ones more and more rarely
+POLL_TIERS = [
+    (timedelta(hours=48), timedelta(minutes=5)),
+    (timedelta(days=7), timedelta(hours=1)),
+    (timedelta(days=30), timedelta(hours=6)),
+    (timedelta(days=90), timedelta(days=1)),
+]
+# AppSetting keys: inbox "Fetch" requests, and the last request the scheduler honoured
+SYNC_REQUESTED_KEY = 'comment_sync_requested_at'
+SYNC_FORCED_KEY = 'comment_sync_forced_at'
+# Rows per INSERT statement (SQLite allows 32766 bound parameters, 7 per row)
+INGEST_CHUNK = 500
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
+def parse_comment(platform, c):
+    """Return (platform_comment_id, author_name, content, created_at) for an API comment."""
+    if platform == 'facebook':
+        author = c.get('from', {}).get('name', 'Unknown')
+        return c['id'], author, c.get('message', ''), _parse_time(c.get('created_time'))
+    if platform == 'instagram':
+        return c['id'], c.get('username', 'Unknown'), c.get('text', ''), _parse_time(c.get('timestamp'))
+    actor = c.get('actor~', {})
+    author = actor.get('localizedFirstName', '') + ' ' + actor.get('localizedLastName', '')
+    message = c.get('message')
+    content = message.get('text', '') if isinstance(message, dict) else str(message or '')
+    created = c.get('created', {}).get('time')
+    created_at = datetime.fromtimestamp(created / 1000, timezone.utc) if created else None
+    return str(c.get('$URN', c.get('id', ''))), author, content, created_at
+
+
+def bulk_ingest(rows):
+    """Insert comment rows, skipping ones already stored, and return how many were new.
+
+    `rows` are dicts with post_result_id, platform, platform_comment_id,
+    author_name, content and created_at. Each INGEST_CHUNK rows go out as one
+    INSERT ... ON CONFLICT DO NOTHING against the (platform,
+    platform_comment_id) unique index and are committed together.
+    """
+    count = 0
+    for start in range(0, len(rows), INGEST_CHUNK):
+        chunk = [dict(row, replied=False) for row in rows[start:start + INGEST_CHUNK]]
+        stmt = insert(Comment.__table__).values(chunk).on_conflict_do_nothing(
+            index_elements=['platform', 'platform_comment_id'])
+        count += db.session.execute(stmt).rowcount
+        db.session.commit()
+    return count
+
+
+def _pages(target):
+    after, first_page = target['cursor'], target['first_page']
+    if target['platform'] == 'facebook':
+        return fb_svc.iter_post_comments(target['platform_post_id'], target['token'], after, first_page)
+    if target['platform'] == 'instagram':
+        return ig_svc.iter_media_comments(target['platform_post_id'], target['token'], after, first_page)
+    # LinkedIn: a single page, no cursor
+    return iter([(li_svc.get_post_comments(target['platform_post_id'], target['token']), None)])
+
+
+def _newest_first(parsed):
+    times = [p[3] for p in parsed if p[3]]
+    return len(times) < 2 or times[0] >= times[-1]
+
+
+class _Limits:
+    """Semaphores bounding concurrent fetches per platform and per access token."""
+
+    def __init__(self, per_platform, per_token):
+        self.per_platform = per_platform
+        self.per_token = per_token
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, size):
+        with self._lock:
+            if key not in self._semaphores:
+                self._semaphores[key] = threading.BoundedSemaphore(size)
+            return self._semaphores[key]
+
+    def hold(self, platform, token):
+        return self._get(('platform', platform), self.per_platform), self._get(('token', token), self.per_token)
+
+
+def _fetch_in_thread(app, limits, target):
+    """Thread entry point: walk one post's new comments.
+
+    Returns {'rows', 'cursor', 'newest', 'error'}; on failure the rows read so
+    far and the cursor to resume from are still returned.
+    """
+    boundary = as_utc(target['last_seen_at'])
+    outcome = {'rows': [], 'cursor': target['cursor'], 'newest': boundary, 'error': None}
+    platform_lock, token_lock = limits.hold(target['platform'], target['token'])
+    with app.app_context(), platform_lock, token_lock:
+        try:
+            for comments, next_cursor in _pages(target):
+                parsed = [parse_comment(target['platform'], c) for c in comments]
+                # Timestamps have one-second resolution: keep the boundary second too,
+                # bulk_ingest skips the comments already stored
+                fresh = [p for p in parsed if not boundary or not p[3] or p[3] >= boundary]
+                now = datetime.now(timezone.utc)
+                outcome['rows'].extend({
+                    'post_result_id': target['id'],
+                    'platform': target['platform'],
+                    'platform_comment_id': platform_comment_id,
+                    'author_name': author_name,
+                    'content': content,
+                    'created_at': created_at or now,
+                } for platform_comment_id, author_name, content, created_at in fresh)
+                for created_at in (p[3] for p in fresh if p[3]):
+                    outcome['newest'] = created_at if outcome['newest'] is None else max(outcome['newest'], created_at)
+                outcome['cursor'] = next_cursor
+                if boundary and len(fresh) < len(parsed) and _newest_first(parsed):
+                    break  # reached comments an earlier sync already has
+            outcome['cursor'] = None
+        except Exception as e:
+            outcome['error'] = str(e)
+    return outcome
+
+
+def _first_pages_in_thread(app, limits, platform, token, post_ids):
+    """Thread entry point: one account's first comment pages, fetched in Graph batches."""
+    platform_lock, token_lock = limits.hold(platform, token)
+    with app.app_context(), platform_lock, token_lock:
+        try:
+            if platform == 'facebook':
+                return fb_svc.get_posts_comment_pages(post_ids, token)
+            return ig_svc.get_medias_comment_pages(post_ids, token)
+        except Exception as e:
+            return [e] * len(post_ids)
+
+
+def _targets(results):
+    accounts = {
+        a.id: a for a in db.session.query(SocialAccount).filter(
+            SocialAccount.id.in_({r.social_account_id for r in results})).all()
+    } if results else {}
+    targets = []
+    for result in results:
+        account = accounts.get(result.social_account_id)
+        if (result.platform not in SYNCED_PLATFORMS or not result.platform_post_id
+                or not account or not account.is_active):
+            continue
+        state = result.sync_state
+        targets.append({
+            'id': result.id,
+            'platform': result.platform,
+            'platform_post_id': result.platform_post_id,
+            'token': account.access_token,
+            'cursor': state.cursor if state else None,
+            'last_seen_at': state.last_seen_at if state else None,
+            'first_page': None,
+        })
+    return targets
+
+
+def _save_state(result_id, outcome):
+    state = db.session.query(CommentSyncState).filter_by(post_result_id=result_id).first()
+    if state is None:
+        state = CommentSyncState(post_result_id=result_id)
+        db.session.add(state)
+    state.cursor = outcome['cursor']
+    if outcome['error'] is None:
+        state.last_seen_at = outcome['newest']
+        state.last_synced_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+
+def sync_results(results):
+    """Sync new comments for many PostResults at once.
+
+    Returns {'new': count, 'failed': [(post_result_id, error), ...]}.
+    """
+    app = current_app._get_current_object()
+    config = app.config
+    limits = _Limits(config['COMMENT_SYNC_PER_PLATFORM'], config['COMMENT_SYNC_PER_TOKEN'])
+    targets = _targets(results)
+    summary = {'new': 0, 'failed': []}
+    if not targets:
+        return summary
+
+    workers = max(1, min(len(targets), config['COMMENT_SYNC_MAX_WORKERS']))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='comments') as pool:
+        # Fresh Graph walks start from a batched first page
+        by_token = {}
+        for target in targets:
+            if target['platform'] in PAGED_PLATFORMS and not target['cursor']:
+                by_token.setdefault((target['platform'], target['token']), []).append(target)
+        batches = {
+            pool.submit(_first_pages_in_thread, app, limits, platform, token,
+                        [t['platform_post_id'] for t in group]): group
+            for (platform, token), group in by_token.items()
+        }
+        for future in as_completed(batches):
+            for target, page in zip(batches[future], future.result()):
+                target['first_page'] = page
+
+        futures = {pool.submit(_fetch_in_thread, app, limits, target): target for target in targets}
+        for future in as_completed(futures):
+            target = futures[future]
+            outcome = future.result()
+            try:
+                summary['new'] += bulk_ingest(outcome['rows'])
+                _save_state(target['id'], outcome)
+            except Exception as e:
+                db.session.rollback()
+                outcome['error'] = outcome['error'] or str(e)
+            if outcome['error']:
+                print(f'[CommentSync] {target["platform"]} post {target["platform_post_id"]} failed: {outcome["error"]}')
+                summary['failed'].append((target['id'], outcome['error']))
+    return summary
+
+
+def _active_since(cutoff):
+    """SQL: the post was published, or last saw a comment, at or after `cutoff`."""
+    return or_(PostResult.published_at >= cutoff, CommentSyncState.last_seen_at >= cutoff)
+
+
+def due_results(now=None, force=False, limit=None):
+    """Successful PostResults whose comments should be synced now, least recently synced first.
+
+    With `force`, every post that isn't dormant is due regardless of when it
+    was last synced. The tier checks run in SQL: since intervals grow with
+    the tiers, a post is due when any tier it is active within has an
+    interval that has passed since its last sync. At most
+    COMMENT_SYNC_MAX_POSTS (or `limit`) posts are returned.
+    """
+    now = now or datetime.now(timezone.utc)
+    config = current_app.config
+    if limit is None:
+        limit = config['COMMENT_SYNC_MAX_POSTS']
+    slowdown = config['COMMENT_SYNC_WEBHOOK_SLOWDOWN'] if config['META_WEBHOOK_VERIFY_TOKEN'] else 1
+    synced = CommentSyncState.last_synced_at
+
+    def synced_before(interval):
+        if slowdown == 1:
+            return synced <= now - interval
+        return or_(
+            and_(PostResult.platform.in_(PAGED_PLATFORMS), synced <= now - interval * slowdown),
+            and_(PostResult.platform.notin_(PAGED_PLATFORMS), synced <= now - interval),
+        )
+
+    query = db.session.query(PostResult).outerjoin(
+        CommentSyncState, CommentSyncState.post_result_id == PostResult.id,
+    ).filter(
+        PostResult.status == 'success',
+        PostResult.platform.in_(SYNCED_PLATFORMS),
+        PostResult.platform_post_id.isnot(None),
+        _active_since(now - POLL_TIERS[-1][0]),
+    )
+    if not force:
+        query = query.filter(or_(
+            synced.is_(None),
+            CommentSyncState.cursor.isnot(None),
+            *(and_(_active_since(now - active_within), synced_before(interval))
+              for active_within, interval in POLL_TIERS),
+        ))
+    return query.order_by(synced.isnot(None), synced, PostResult.id).limit(limit).all()
+
+
+def request_sync():
+    """Ask the background job to sync every non-dormant post on its next run."""
+    AppSetting.set(SYNC_REQUESTED_KEY, datetime.now(timezone.utc).isoformat())
+
+
+def run_background_sync():
+    """Scheduler entry point: sync the posts that are due (all active ones after a request)."""
+    requested = AppSetting.get(SYNC_REQUESTED_KEY)
+    force = bool(requested) and requested > (AppSetting.get(SYNC_FORCED_KEY) or '')
+    if force:
+        AppSetting.set(SYNC_FORCED_KEY, requested)
+    results = due_results(force=force)
+    if not results:
+        return
+    outcome = sync_results(results)
+    print(f"[CommentSync] synced {len(results)} post(s): {outcome['new']} new comment(s), "
+          f"{len(outcome['failed'])} failed")
+
+
+def _webhook_changes(payload):
+    """Yield (platform, verb, platform_post_id, row) for comment changes in a Meta webhook payload."""
+    for entry in payload.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value') or {}
+            if payload.get('object') == 'page' and change.get('field') == 'feed':
+                if value.get('item') != 'comment' or not value.get('comment_id'):
+                    continue
+                created = value.get('created_time') or entry.get('time')
+                yield 'facebook', value.get('verb', 'add'), value.get('post_id'), {
+                    'platform_comment_id': value['comment_id'],
+                    'author_name': (value.get('from') or {}).get('name', 'Unknown'),
+                    'content': value.get('message', ''),
+                    'created_at': datetime.fromtimestamp(int(created), timezone.utc) if created else None,
+                }
+            elif payload.get('object') == 'instagram' and change.get('field') == 'comments':
+                if not value.get('id'):
+                    continue
+                created = entry.get('time')
+                yield 'instagram', 'add', (value.get('media') or {}).get('id'), {
+                    'platform_comment_id': value['id'],
+                    'author_name': (value.get('from') or {}).get('username', 'Unknown'),
+                    'content': value.get('text', ''),
+                    'created_at': datetime.fromtimestamp(int(created), timezone.utc) if created else None,
+                }
+
+
+def ingest_webhook(payload):
+    """Apply a Meta webhook delivery: new comments are bulk-ingested, edits and removals applied.
+
+    Comments on posts this app didn't publish are ignored. Returns the number of new comments.
+    """
+    changes = list(_webhook_changes(payload))
+    if not changes:
+        return 0
+    post_ids = {(platform, post_id) for platform, _, post_id, _ in changes if post_id}
+    results = {
+        (r.platform, r.platform_post_id): r.id
+        for r in db.session.query(PostResult.id, PostResult.platform, PostResult.platform_post_id).filter(
+            PostResult.status == 'success',
+            PostResult.platform_post_id.in_({post_id for _, post_id in post_ids}),
+        )
+    } if post_ids else {}
+
+    rows = []
+    now = datetime.now(timezone.utc)
+    for platform, verb, post_id, row in changes:
+        comment = db.session.query(Comment).filter_by(
+            platform=platform, platform_comment_id=row['platform_comment_id'])
+        if verb == 'remove':
+            comment.delete()
+        elif verb == 'edited':
+            comment.update({'content': row['content']})
+        elif (platform, post_id) in results:
+            rows.append(dict(row, post_result_id=results[(platform, post_id)], platform=platform,
+                             created_at=row['created_at'] or now))
+    db.session.commit()
+    return bulk_ingest(rows)
@@ -0,0 +1,103 @@
+"""In-memory min-heap of upcoming scheduled_at deadlines.
+
+The scheduler sleeps until the earliest deadline instead of polling the
+posts table. Compose calls notify_scheduled() after committing a scheduled
+post: in the same process this pushes straight onto the heap, and on
+Postgres a NOTIFY reaches a scheduler running in another process. A slow
+safety reload() from the DB covers anything a notification missed.
+"""
+import heapq
+import select
+import threading
+from datetime import datetime
+from sqlalchemy import text
+from app_package import db
+from app_package.models import Post
+from app_package.services.sql import as_utc
+
+CHANNEL = 'bhouma_scheduled'
+
+_heap = []  # (scheduled_at, post_id)
+_lock = threading.Lock()
+_listeners = []
+
+
+def subscribe(callback):
+    """Call `callback()` whenever a new deadline is pushed."""
+    _listeners.append(callback)
+
+
+def push(post_id, when):
+    # Only a process running the scheduler keeps a heap; web workers just notify.
+    if not _listeners:
+        return
+    with _lock:
+        heapq.heappush(_heap, (as_utc(when), post_id))
+    for callback in list(_listeners):
+        callback()
+
+
+def reload():
+    """Rebuild the heap from every post still waiting to go out."""
+    rows = db.session.query(Post.id, Post.scheduled_at).filter(
+        Post.status == 'scheduled',
+        Post.scheduled_at.isnot(None),
+    ).all()
+    with _lock:
+        _heap[:] = [(as_utc(when), post_id) for post_id, when in rows]
+        heapq.heapify(_heap)
+
+
+def next_deadline():
+    with _lock:
+        return _heap[0][0] if _heap else None
+
+
+def pop_due(now):
+    """Drop every deadline at or before `now` and return them."""
+    popped = []
+    with _lock:
+        while _heap and _heap[0][0] <= now:
+            popped.append(heapq.heappop(_heap))
+    return popped
+
+
+def restore(entries):
+    """Put back deadlines returned by pop_due() (without notifying subscribers)."""
+    with _lock:
+        for entry in entries:
+            heapq.heappush(_heap, entry)
+
+
+def notify_scheduled(post):
+    """Tell the scheduler about a newly scheduled post. Call after the post is committed."""
+    push(post.id, post.scheduled_at)
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_notify(:channel, :payload)'), {
+            'channel': CHANNEL,
+            'payload': f'{post.id}|{as_utc(post.scheduled_at).isoformat()}',
+        })
+        db.session.commit()
+
+
+def listen(stop):
+    """Postgres only: feed NOTIFY payloads from web processes into the heap until `stop` is set."""
+    while not stop.is_set():
+        raw = db.engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            conn.cursor().execute(f'LISTEN {CHANNEL}')
+            while not stop.is_set():
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    payload = conn.notifies.pop(0).payload
+                    post_id, when = payload.split('|', 1)
+                    push(int(post_id), datetime.fromisoformat(when))
+        except Exception as e:
+            print(f'Scheduler: deadline listener error, reconnecting: {e}')
+            stop.wait(5)
+        finally:
+            raw.invalidate()
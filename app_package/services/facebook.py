@@ -1,8 +1,17 @@
 """Facebook Graph API v22.0 service."""
-import requests
+import json
+import os
+from urllib.parse import urlencode
 from flask import current_app
+from app_package import db
+from app_package.models import MediaUpload
+from app_package.services import http_client, media
 
 GRAPH_URL = 'https://graph.facebook.com/v22.0'
+GRAPH_VIDEO_URL = 'https://graph-video.facebook.com/v22.0'
+# Most sub-requests / ids the Graph API accepts in one batch or ?ids= call
+BATCH_LIMIT = 50
+COMMENT_FIELDS = 'id,message,from,created_time'
 
 
 def get_auth_url(redirect_uri):
@@ -21,7 +30,7 @@ def exchange_code(code, redirect_uri):
     app_secret = current_app.config['META_APP_SECRET']
 
     # Short-lived token
-    resp = requests.get(f'{GRAPH_URL}/oauth/access_token', params={
+    resp = http_client.get('facebook', f'{GRAPH_URL}/oauth/access_token', params={
         'client_id': app_id,
         'client_secret': app_secret,
         'redirect_uri': redirect_uri,
@@ -33,7 +42,7 @@ def exchange_code(code, redirect_uri):
     short_token = data['access_token']
 
     # Long-lived token
-    resp = requests.get(f'{GRAPH_URL}/oauth/access_token', params={
+    resp = http_client.get('facebook', f'{GRAPH_URL}/oauth/access_token', params={
         'grant_type': 'fb_exchange_token',
         'client_id': app_id,
         'client_secret': app_secret,
@@ -47,7 +56,7 @@ def exchange_code(code, redirect_uri):
 
 def get_pages(user_token):
     """Get list of pages the user manages."""
-    resp = requests.get(f'{GRAPH_URL}/me/accounts', params={
+    resp = http_client.get('facebook', f'{GRAPH_URL}/me/accounts', params={
         'access_token': user_token,
         'fields': 'id,name,access_token,picture',
     }, timeout=15)
@@ -59,16 +68,83 @@ def get_pages(user_token):
 
 def get_page_info(page_id, page_token):
     """Get page info."""
-    resp = requests.get(f'{GRAPH_URL}/{page_id}', params={
+    resp = http_client.get('facebook', f'{GRAPH_URL}/{page_id}', params={
         'access_token': page_token,
         'fields': 'id,name,picture',
     }, timeout=15)
     return resp.json()
 
 
+def _graph_exception(body, default):
+    error = body.get('error') if isinstance(body, dict) else None
+    return Exception((error or {}).get('message', default))
+
+
+def batch_get(token, requests, platform='facebook'):
+    """Send many Graph GETs as batch calls of up to BATCH_LIMIT sub-requests.
+
+    `requests` is a list of (path, params) pairs such as
+    ('123_456/comments', {'fields': 'id,message'}). Returns a list in the same
+    order holding each parsed response body, or an exception for a
+    sub-request that failed — one bad object doesn't fail the others.
+    """
+    results = []
+    for start in range(0, len(requests), BATCH_LIMIT):
+        chunk = requests[start:start + BATCH_LIMIT]
+        batch = [
+            {'method': 'GET', 'relative_url': f'{path}?{urlencode(params)}' if params else path}
+            for path, params in chunk
+        ]
+        try:
+            resp = http_client.post(platform, GRAPH_URL, data={
+                'access_token': token,
+                'batch': json.dumps(batch),
+                'include_headers': 'false',
+            }, timeout=60)
+            data = resp.json()
+            if not isinstance(data, list):
+                raise _graph_exception(data, f'Batch request failed ({resp.status_code})')
+        except Exception as e:
+            results.extend([e] * len(chunk))
+            continue
+        for item in data:
+            if item is None:  # Graph gave up on this sub-request
+                results.append(Exception('Batch sub-request timed out'))
+                continue
+            try:
+                body = json.loads(item.get('body') or '{}')
+            except ValueError:
+                body = {}
+            if item.get('code') != 200 or 'error' in body:
+                results.append(_graph_exception(body, f'Graph request failed ({item.get("code")})'))
+            else:
+                results.append(body)
+    return results
+
+
+def get_objects(ids, token, fields, platform='facebook'):
+    """Read several Graph objects with multi-id ?ids= lookups, BATCH_LIMIT ids per call.
+
+    Returns {id: object}; ids the API doesn't return are missing from the dict.
+    """
+    objects = {}
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_LIMIT):
+        resp = http_client.get(platform, f'{GRAPH_URL}/', params={
+            'ids': ','.join(ids[start:start + BATCH_LIMIT]),
+            'fields': fields,
+            'access_token': token,
+        }, timeout=30)
+        data = resp.json()
+        if 'error' in data:
+            raise _graph_exception(data, 'Failed to get objects')
+        objects.update(data)
+    return objects
+
+
 def publish_text(page_id, page_token, message):
     """Publish a text post to a Facebook Page."""
-    resp = requests.post(f'{GRAPH_URL}/{page_id}/feed', data={
+    resp = http_client.post('facebook', f'{GRAPH_URL}/{page_id}/feed', data={
         'message': message,
         'access_token': page_token,
     }, timeout=30)
@@ -81,7 +157,7 @@ def publish_text(page_id, page_token, message):
 def publish_photo(page_id, page_token, message, image_path):
     """Publish a photo post to a Facebook Page."""
     with open(image_path, 'rb') as f:
-        resp = requests.post(f'{GRAPH_URL}/{page_id}/photos', data={
+        resp = http_client.post('facebook', f'{GRAPH_URL}/{page_id}/photos', data={
             'message': message,
             'access_token': page_token,
         }, files={'source': f}, timeout=60)
@@ -91,11 +167,74 @@ def publish_photo(page_id, page_token, message, image_path):
     return data.get('post_id') or data.get('id')
 
 
+def _video_phase(page_id, page_token, phase, chunk=None, **fields):
+    """One call of the resumable video upload protocol (start / transfer / finish)."""
+    data = dict(fields, upload_phase=phase, access_token=page_token)
+    files = {'video_file_chunk': ('chunk', chunk, 'application/octet-stream')} if chunk is not None else None
+    resp = http_client.post('facebook', f'{GRAPH_VIDEO_URL}/{page_id}/videos',
+                            data=data, files=files, timeout=120)
+    result = resp.json()
+    if 'error' in result:
+        raise media.UploadRejected(result['error'].get('message', f'Video upload {phase} failed'))
+    return result
+
+
+def _upload_video(page_id, page_token, message, video_path, upload):
+    """Send the remaining chunks of `upload` (a MediaUpload) and finish it. Returns the video id."""
+    chunk_bytes = current_app.config['VIDEO_CHUNK_BYTES']
+    if not upload.session_id:
+        started = _video_phase(page_id, page_token, 'start', file_size=upload.file_size)
+        upload.session_id = started['upload_session_id']
+        upload.video_id = started['video_id']
+        upload.offset = int(started['start_offset'])
+        db.session.commit()
+
+    while upload.offset < upload.file_size:
+        chunk = media.read_chunk(video_path, upload.offset, chunk_bytes)
+        result = _video_phase(page_id, page_token, 'transfer', chunk,
+                              upload_session_id=upload.session_id, start_offset=upload.offset)
+        upload.offset = int(result['start_offset'])
+        db.session.commit()
+        if result['start_offset'] == result['end_offset']:
+            break
+
+    _video_phase(page_id, page_token, 'finish', upload_session_id=upload.session_id, description=message)
+    return upload.video_id
+
+
+def publish_video(page_id, page_token, message, video_path):
+    """Publish a video post to a Facebook Page through a resumable upload session.
+
+    The file is sent from disk in VIDEO_CHUNK_BYTES chunks and the acknowledged
+    offset is saved after each one (MediaUpload), so a retried publish carries
+    on where the last attempt stopped. A session Facebook no longer accepts is
+    dropped and the upload starts over once.
+    """
+    key = ('facebook', page_id, media.digest_of(video_path))
+    upload = MediaUpload.find(*key)
+    resumed = upload is not None
+    if upload is None:
+        upload = MediaUpload(platform='facebook', owner=page_id, file_hash=key[2],
+                             file_size=os.path.getsize(video_path))
+        db.session.add(upload)
+        db.session.commit()
+    try:
+        video_id = _upload_video(page_id, page_token, message, video_path, upload)
+    except media.UploadRejected as e:
+        if not resumed:
+            raise
+        print(f'[Facebook] Resuming video upload failed ({e}), starting over')
+        MediaUpload.discard(*key)
+        return publish_video(page_id, page_token, message, video_path)
+    MediaUpload.discard(*key)
+    return video_id
+
+
 def get_post_comments(post_id, page_token):
     """Get comments on a post."""
-    resp = requests.get(f'{GRAPH_URL}/{post_id}/comments', params={
+    resp = http_client.get('facebook', f'{GRAPH_URL}/{post_id}/comments', params={
         'access_token': page_token,
-        'fields': 'id,message,from,created_time',
+        'fields': COMMENT_FIELDS,
         'limit': 100,
     }, timeout=15)
     data = resp.json()
@@ -104,9 +243,51 @@ def get_post_comments(post_id, page_token):
     return data.get('data', [])
 
 
+def iter_pages(url, params, platform='facebook', first_page=None):
+    """Follow a Graph edge's paging.next lazily, yielding (items, next_cursor) per page.
+
+    next_cursor is the 'after' cursor to resume from the following page, or
+    None on the last page. `first_page` is an already fetched first page
+    (e.g. from batch_get), or the exception fetching it raised.
+    """
+    data = first_page
+    while True:
+        if isinstance(data, Exception):
+            raise data
+        if data is None:
+            resp = http_client.get(platform, url, params=params, timeout=15)
+            data = resp.json()
+        if 'error' in data:
+            raise _graph_exception(data, 'Failed to read page')
+        paging = data.get('paging', {})
+        next_url = paging.get('next')
+        yield data.get('data', []), paging.get('cursors', {}).get('after') if next_url else None
+        if not next_url:
+            return
+        url, params, data = next_url, None, None  # next already carries every parameter
+
+
+def comment_page_params(after=None):
+    params = {'fields': COMMENT_FIELDS, 'limit': 100, 'order': 'reverse_chronological'}
+    if after:
+        params['after'] = after
+    return params
+
+
+def iter_post_comments(post_id, page_token, after=None, first_page=None):
+    """Comments on a post, newest first, as lazily fetched (comments, next_cursor) pages."""
+    return iter_pages(f'{GRAPH_URL}/{post_id}/comments',
+                      dict(comment_page_params(after), access_token=page_token), first_page=first_page)
+
+
+def get_posts_comment_pages(post_ids, page_token):
+    """First comment page of several posts of one Page, batched. Returns page bodies or exceptions."""
+    return batch_get(page_token, [(f'{post_id}/comments', comment_page_params()) for post_id in post_ids])
+
+
 def reply_to_comment(comment_id, page_token, message):
     """Reply to a comment."""
-    resp = requests.post(f'{GRAPH_URL}/{comment_id}/comments', data={
+    resp = http_client.post('facebook', f'{GRAPH_URL}/{comment_id}/comments', data={
         'message': message,
         'access_token': page_token,
     }, timeout=15)
@@ -119,7 +300,7 @@ def reply_to_comment(comment_id, page_token, message):
 def get_page_insights(page_id, page_token, period='day'):
     """Get page insights."""
     metrics = 'page_impressions,page_engaged_users,page_fans'
-    resp = requests.get(f'{GRAPH_URL}/{page_id}/insights', params={
+    resp = http_client.get('facebook', f'{GRAPH_URL}/{page_id}/insights', params={
         'access_token': page_token,
         'metric': metrics,
         'period': period,
@@ -132,7 +313,7 @@ def get_page_insights(page_id, page_token, period='day'):
 
 def get_post_insights(post_id, page_token):
     """Get engagement for a specific post."""
-    resp = requests.get(f'{GRAPH_URL}/{post_id}', params={
+    resp = http_client.get('facebook', f'{GRAPH_URL}/{post_id}', params={
         'access_token': page_token,
         'fields': 'likes.summary(true),comments.summary(true),shares',
     }, timeout=15)
@@ -144,3 +325,43 @@ def get_post_insights(post_id, page_token):
         'comments': data.get('comments', {}).get('summary', {}).get('total_count', 0),
         'shares': data.get('shares', {}).get('count', 0),
     }
+
+
+def get_insight_values(object_ids, token, metrics, platform='facebook'):
+    """{object_id: {metric name: latest value}} for several objects, in batch calls.
+
+    Kept out of the ?ids= lookups: an object that doesn't support a metric
+    (e.g. an old or unsupported post type) fails its own sub-request only,
+    and is missing from the result.
+    """
+    object_ids = list(object_ids)
+    results = batch_get(token, [(f'{object_id}/insights', {'metric': metrics}) for object_id in object_ids],
+                        platform=platform)
+    return {
+        object_id: {
+            item['name']: item['values'][-1].get('value', 0) if item.get('values') else 0
+            for item in result.get('data', [])
+        }
+        for object_id, result in zip(object_ids, results)
+        if not isinstance(result, Exception)
+    }
+
+
+def get_posts_insights(post_ids, page_token):
+    """Engagement for several posts: counters in ?ids= lookups, impressions and reach in batch calls.
+
+    Returns {post_id: {likes, comments, shares, impressions, reach}};
+    impressions and reach are None for posts whose insights can't be read.
+    """
+    objects = get_objects(post_ids, page_token, 'likes.summary(true),comments.summary(true),shares')
+    insights = get_insight_values(objects, page_token, 'post_impressions,post_impressions_unique')
+    return {
+        post_id: {
+            'likes': data.get('likes', {}).get('summary', {}).get('total_count', 0),
+            'comments': data.get('comments', {}).get('summary', {}).get('total_count', 0),
+            'shares': data.get('shares', {}).get('count', 0),
+            'impressions': insights.get(post_id, {}).get('post_impressions'),
+            'reach': insights.get(post_id, {}).get('post_impressions_unique'),
+        }
+        for post_id, data in objects.items()
+    }
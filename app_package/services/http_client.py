@@ -0,0 +1,121 @@
+"""Single funnel for outbound calls to the social platform APIs.
+
+Services call http_client.get/post/put with the platform name. Every call:
+
+- goes through the shared rate limiter,
+- reuses a warm keep-alive connection from that platform's pooled
+  requests.Session (one urllib3 pool per host, HTTP_POOL_* sized),
+- is retried and circuit-broken per platform by services/resilience,
+- reports the timing of each attempt to hooks registered with add_timing_hook().
+"""
+import threading
+import time
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from app_package.services import resilience
+from app_package.services.rate_limit import limiter
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_timing_hooks = []
+
+
+def add_timing_hook(hook):
+    """Register hook(platform, method, url, status_code, elapsed_seconds); status is None on errors."""
+    _timing_hooks.append(hook)
+
+
+def _log_slow_calls(platform, method, url, status_code, elapsed):
+    threshold = current_app.config['HTTP_SLOW_CALL_SECONDS']
+    if threshold and elapsed >= threshold:
+        print(f'[HTTP] slow {platform} {method} {url.split("?")[0]} -> {status_code} in {elapsed:.2f}s')
+
+
+add_timing_hook(_log_slow_calls)
+
+
+def _build_session():
+    config = current_app.config
+    # Retries live in services/resilience, which knows which calls are safe to repeat
+    adapter = HTTPAdapter(
+        pool_connections=config['HTTP_POOL_CONNECTIONS'],
+        pool_maxsize=config['HTTP_POOL_MAXSIZE'],
+        max_retries=0,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(platform):
+    """The shared, pooled session for a platform (created on first use)."""
+    session = _sessions.get(platform)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(platform)
+            if session is None:
+                session = _sessions[platform] = _build_session()
+    return session
+
+
+def _token_of(kwargs):
+    """Find the access token a call is made with (Graph params/data or a Bearer header)."""
+    for field in ('params', 'data'):
+        payload = kwargs.get(field)
+        if isinstance(payload, dict) and payload.get('access_token'):
+            return payload['access_token']
+    auth = (kwargs.get('headers') or {}).get('Authorization', '')
+    return auth[7:] if auth.startswith('Bearer ') else None
+
+
+def _file_bodies(kwargs):
+    """File objects being uploaded, with their start offsets, so retries can rewind them."""
+    bodies = []
+    data = kwargs.get('data')
+    if hasattr(data, 'seek'):
+        bodies.append(data)
+    for value in (kwargs.get('files') or {}).values():
+        fileobj = value[1] if isinstance(value, tuple) else value
+        if hasattr(fileobj, 'seek'):
+            bodies.append(fileobj)
+    return [(f, f.tell()) for f in bodies]
+
+
+def request(platform, method, url, **kwargs):
+    token = _token_of(kwargs)
+    bodies = _file_bodies(kwargs)
+
+    def send():
+        for fileobj, offset in bodies:
+            fileobj.seek(offset)
+        limiter.acquire(platform, token)
+        started = time.monotonic()
+        status_code = None
+        try:
+            resp = get_session(platform).request(method, url, **kwargs)
+            status_code = resp.status_code
+        finally:
+            elapsed = time.monotonic() - started
+            for hook in list(_timing_hooks):
+                try:
+                    hook(platform, method, url, status_code, elapsed)
+                except Exception as e:
+                    print(f'[HTTP] timing hook failed: {e}')
+        limiter.observe(platform, token, resp)
+        return resp
+
+    return resilience.call(platform, method, send)
+
+
+def get(platform, url, **kwargs):
+    return request(platform, 'GET', url, **kwargs)
+
+
+def post(platform, url, **kwargs):
+    return request(platform, 'POST', url, **kwargs)
+
+
+def put(platform, url, **kwargs):
+    return request(platform, 'PUT', url, **kwargs)
@@ -2,6 +2,7 @@ from datetime import datetime, timezone, timedelta
 from sqlalchemy import func
 from app_package import db
 from app_package.models import PostResult, Post, SocialAccount
+from app_package.services import snapshots
 
 
 def compute_account_metrics(account_id):
@@ -148,14 +149,18 @@ def compute_health_score(metrics):
 
 
 def get_performance_trend(account_id, weeks=8):
-    """Get weekly engagement + post count for trend chart."""
+    """Get weekly engagement + post count for trend chart.
+
+    `engagement` is what the posts published that week have earned so far;
+    `engagement_gained` is what all of the account's posts earned during
+    that week, read from the engagement snapshot series.
+    """
     now = datetime.now(timezone.utc)
+    boundaries = [now - timedelta(weeks=i) for i in range(weeks, -1, -1)]
+    gained = snapshots.engagement_gained(account_id, boundaries)
     trend = []
 
-    for i in range(weeks - 1, -1, -1):
-        week_end = now - timedelta(weeks=i)
-        week_start = week_end - timedelta(weeks=1)
-
+    for week_start, week_end, week_gained in zip(boundaries, boundaries[1:], gained):
         results = (
             db.session.query(PostResult)
             .filter(
@@ -177,6 +182,7 @@ def get_performance_trend(account_id, weeks=8):
             'week': week_start.strftime('%b %d'),
             'posts': post_count,
             'engagement': engagement,
+            'engagement_gained': week_gained,
         })
 
     return trend
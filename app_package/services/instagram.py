@@ -1,9 +1,18 @@
 """Instagram Graph API v22.0 service (via Meta Business)."""
-import requests
+import heapq
 import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
+from app_package.services import facebook as fb_svc, http_client
 
 GRAPH_URL = 'https://graph.facebook.com/v22.0'
+PROFILE_FIELDS = 'id,name,username,profile_picture_url,followers_count,media_count'
+COMMENT_FIELDS = 'id,text,username,timestamp'
+
+# Media container readiness polling (seconds)
+CONTAINER_POLL_INITIAL = 0.5
+CONTAINER_POLL_CAP = 8
+CONTAINER_POLL_TIMEOUT = 120
 
 
 def get_auth_url(redirect_uri):
@@ -20,32 +29,22 @@ def get_auth_url(redirect_uri):
     )
 
 
-def get_ig_account_from_page(page_id, page_token):
-    """Get the Instagram Business Account linked to a Facebook Page."""
-    resp = requests.get(f'{GRAPH_URL}/{page_id}', params={
-        'access_token': page_token,
-        'fields': 'instagram_business_account',
-    }, timeout=15)
-    data = resp.json()
-    ig_account = data.get('instagram_business_account')
-    if not ig_account:
-        return None
-    return ig_account.get('id')
-
+def get_ig_accounts_for_pages(page_ids, token):
+    """Instagram Business profiles linked to several Pages, in ?ids= lookups.
 
-def get_ig_profile(ig_user_id, token):
-    """Get IG business profile info."""
-    resp = requests.get(f'{GRAPH_URL}/{ig_user_id}', params={
-        'access_token': token,
-        'fields': 'id,name,username,profile_picture_url,followers_count,media_count',
-    }, timeout=15)
-    return resp.json()
+    Returns {page_id: profile} for the Pages that have one.
+    """
+    pages = fb_svc.get_objects(page_ids, token, f'instagram_business_account{{{PROFILE_FIELDS}}}',
+                               platform='instagram')
+    return {
+        page_id: page['instagram_business_account']
+        for page_id, page in pages.items() if page.get('instagram_business_account')
+    }
 
 
-def publish_photo(ig_user_id, token, image_url, caption=''):
-    """Two-step publish: create container, then publish."""
-    # Step 1: Create container
-    resp = requests.post(f'{GRAPH_URL}/{ig_user_id}/media', data={
+def create_container(ig_user_id, token, image_url, caption=''):
+    """Step 1 of publishing: create a media container, returns its id."""
+    resp = http_client.post('instagram', f'{GRAPH_URL}/{ig_user_id}/media', data={
         'image_url': image_url,
         'caption': caption,
         'access_token': token,
@@ -53,13 +52,73 @@ def publish_photo(ig_user_id, token, image_url, caption=''):
     data = resp.json()
     if 'error' in data:
         raise Exception(data['error'].get('message', 'Container creation failed'))
-    container_id = data['id']
+    return data['id']
 
-    # Wait for container to be ready
-    time.sleep(3)
 
-    # Step 2: Publish
-    resp = requests.post(f'{GRAPH_URL}/{ig_user_id}/media_publish', data={
+def get_container_status(container_id, token):
+    """Return the container's status_code (IN_PROGRESS / FINISHED / ERROR / EXPIRED / PUBLISHED)."""
+    resp = http_client.get('instagram', f'{GRAPH_URL}/{container_id}', params={
+        'access_token': token,
+        'fields': 'status_code,status',
+    }, timeout=15)
+    data = resp.json()
+    if 'error' in data:
+        raise Exception(data['error'].get('message', 'Container status check failed'))
+    return data.get('status_code'), data.get('status', '')
+
+
+def container_poller(container_id, token, initial=CONTAINER_POLL_INITIAL,
+                     cap=CONTAINER_POLL_CAP, timeout=CONTAINER_POLL_TIMEOUT):
+    """State machine for one container, as a generator.
+
+    Each step checks status_code once and yields how many seconds to wait
+    before the next check (exponential backoff, capped). It returns when the
+    container is ready and raises if it errors, expires or times out.
+    """
+    delay = initial
+    waited = 0
+    while True:
+        status_code, status = get_container_status(container_id, token)
+        if status_code in ('FINISHED', 'PUBLISHED'):
+            return
+        if status_code in ('ERROR', 'EXPIRED'):
+            raise Exception(f'Container {status_code.lower()}: {status or container_id}')
+        if waited >= timeout:
+            raise Exception(f'Container not ready after {int(waited)}s')
+        yield delay
+        waited += delay
+        delay = min(delay * 2, cap)
+
+
+def wait_for_containers(pollers):
+    """Drive many container pollers cooperatively from one thread.
+
+    `pollers` maps a key to a container_poller(). Returns a dict of key ->
+    None when ready, or the exception that poller raised.
+    """
+    outcomes = {}
+    wakeups = [(0.0, i, key) for i, key in enumerate(pollers)]
+    heapq.heapify(wakeups)
+    start = time.monotonic()
+    while wakeups:
+        wake_at, seq, key = heapq.heappop(wakeups)
+        pause = wake_at - (time.monotonic() - start)
+        if pause > 0:
+            time.sleep(pause)
+        try:
+            delay = next(pollers[key])
+        except StopIteration:
+            outcomes[key] = None
+        except Exception as e:
+            outcomes[key] = e
+        else:
+            heapq.heappush(wakeups, (time.monotonic() - start + delay, seq, key))
+    return outcomes
+
+
+def publish_container(ig_user_id, token, container_id):
+    """Final step of publishing: publish a ready container, returns the media id."""
+    resp = http_client.post('instagram', f'{GRAPH_URL}/{ig_user_id}/media_publish', data={
         'creation_id': container_id,
         'access_token': token,
     }, timeout=30)
@@ -69,22 +128,86 @@ def publish_photo(ig_user_id, token, image_url, caption=''):
     return data.get('id')
 
 
-def get_media_comments(media_id, token):
-    """Get comments on an IG media."""
-    resp = requests.get(f'{GRAPH_URL}/{media_id}/comments', params={
-        'access_token': token,
-        'fields': 'id,text,username,timestamp',
-        'limit': 100,
-    }, timeout=15)
-    data = resp.json()
-    if 'error' in data:
-        raise Exception(data['error'].get('message', 'Failed to get comments'))
-    return data.get('data', [])
+def _in_app_context(app, func, *args):
+    """Thread entry point: call func(*args) inside the app context; return its result or exception."""
+    with app.app_context():
+        try:
+            return func(*args)
+        except Exception as e:
+            return e
+
+
+def publish_photos(items):
+    """Publish several photos with all their containers in flight at once.
+
+    Containers are created, and ready ones published, concurrently (up to
+    PUBLISH_MAX_WORKERS threads), so Instagram's server-side image fetch
+    runs for every account at the same time; only the status polling is
+    shared, cooperatively, by the calling thread.
+
+    `items` is a list of (ig_user_id, token, image_url, caption). Returns a
+    list of media ids or exceptions, in the same order.
+    """
+    results = [None] * len(items)
+    if not items:
+        return results
+    app = current_app._get_current_object()
+    workers = max(1, min(len(items), app.config['PUBLISH_MAX_WORKERS']))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ig-containers') as pool:
+        created = [pool.submit(_in_app_context, app, create_container, *item) for item in items]
+        containers = {}
+        pollers = {}
+        for i, future in enumerate(created):
+            outcome = future.result()
+            if isinstance(outcome, Exception):
+                results[i] = outcome
+                continue
+            containers[i] = outcome
+            pollers[i] = container_poller(outcome, items[i][1])
+
+        published = {}
+        for i, error in wait_for_containers(pollers).items():
+            if error:
+                results[i] = error
+                continue
+            ig_user_id, token = items[i][0], items[i][1]
+            published[i] = pool.submit(_in_app_context, app, publish_container, ig_user_id, token, containers[i])
+        for i, future in published.items():
+            results[i] = future.result()
+    return results
+
+
+def publish_photo(ig_user_id, token, image_url, caption=''):
+    """Create a container, wait until Instagram has processed it, then publish."""
+    result = publish_photos([(ig_user_id, token, image_url, caption)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def comment_page_params(after=None):
+    params = {'fields': COMMENT_FIELDS, 'limit': 100}
+    if after:
+        params['after'] = after
+    return params
+
+
+def iter_media_comments(media_id, token, after=None, first_page=None):
+    """Comments on an IG media as lazily fetched (comments, next_cursor) pages."""
+    return fb_svc.iter_pages(f'{GRAPH_URL}/{media_id}/comments',
+                             dict(comment_page_params(after), access_token=token),
+                             platform='instagram', first_page=first_page)
+
+
+def get_medias_comment_pages(media_ids, token):
+    """First comment page of several media of one account, batched. Returns page bodies or exceptions."""
+    return fb_svc.batch_get(token, [(f'{media_id}/comments', comment_page_params()) for media_id in media_ids],
+                            platform='instagram')
 
 
 def reply_to_comment(comment_id, token, message):
     """Reply to an IG comment."""
-    resp = requests.post(f'{GRAPH_URL}/{comment_id}/replies', data={
+    resp = http_client.post('instagram', f'{GRAPH_URL}/{comment_id}/replies', data={
         'message': message,
         'access_token': token,
     }, timeout=15)
@@ -97,7 +220,7 @@ def reply_to_comment(comment_id, token, message):
 def get_account_insights(ig_user_id, token, period='day'):
     """Get IG account insights."""
     metrics = 'impressions,reach,follower_count'
-    resp = requests.get(f'{GRAPH_URL}/{ig_user_id}/insights', params={
+    resp = http_client.get('instagram', f'{GRAPH_URL}/{ig_user_id}/insights', params={
         'access_token': token,
         'metric': metrics,
         'period': period,
@@ -110,7 +233,7 @@ def get_account_insights(ig_user_id, token, period='day'):
 
 def get_media_insights(media_id, token):
     """Get insights for a specific IG media."""
-    resp = requests.get(f'{GRAPH_URL}/{media_id}/insights', params={
+    resp = http_client.get('instagram', f'{GRAPH_URL}/{media_id}/insights', params={
         'access_token': token,
         'metric': 'impressions,reach,engagement',
     }, timeout=15)
@@ -121,3 +244,22 @@ def get_media_insights(media_id, token):
     for item in data.get('data', []):
         result[item['name']] = item['values'][0]['value'] if item.get('values') else 0
     return result
+
+
+def get_medias_engagement(media_ids, token):
+    """Like/comment counts of several media in ?ids= lookups, and their reach in batch calls.
+
+    Returns {media_id: {likes, comments, reach}}; reach is None for media
+    whose insights can't be read (e.g. posted before the account was a
+    business account).
+    """
+    objects = fb_svc.get_objects(media_ids, token, 'like_count,comments_count', platform='instagram')
+    reach = fb_svc.get_insight_values(objects, token, 'reach', platform='instagram')
+    return {
+        media_id: {
+            'likes': data.get('like_count', 0),
+            'comments': data.get('comments_count', 0),
+            'reach': reach.get(media_id, {}).get('reach'),
+        }
+        for media_id, data in objects.items()
+    }
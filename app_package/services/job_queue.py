@@ -0,0 +1,163 @@
+"""Durable, DB-backed publish job queue.
+
+Routes and the scheduler enqueue a PublishJob in the same transaction that
+flips the post to 'publishing'; worker processes (worker.py) claim jobs,
+publish, and record the outcome. A claimed job carries a lease that the
+worker renews with a heartbeat while it publishes; if the worker dies the
+lease runs out and another worker reclaims the job. The worker's in-flight
+publish ledger entries share that lease, so the reclaiming worker can
+retry the accounts the dead one never finished.
+"""
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from app_package import db
+from app_package.models import Post, PublishJob, PublishLedger
+from app_package.services.claims import claim, worker_id
+
+
+def enqueue_publish(post):
+    """Queue a post for publishing. The caller commits."""
+    job = PublishJob(post=post, status='queued', run_after=datetime.now(timezone.utc))
+    db.session.add(job)
+    return job
+
+
+def _claimable(now):
+    return or_(
+        and_(PublishJob.status == 'queued', PublishJob.run_after <= now),
+        and_(PublishJob.status == 'running', PublishJob.lease_expires_at < now),
+    )
+
+
+def claim_next(owner):
+    """Atomically claim the next runnable job (or a job whose lease expired)."""
+    now = datetime.now(timezone.utc)
+    lease = timedelta(seconds=current_app.config['PUBLISH_JOB_LEASE_SECONDS'])
+    ids = claim(
+        PublishJob,
+        _claimable(now),
+        {
+            'status': 'running',
+            'locked_by': owner,
+            'locked_at': now,
+            'heartbeat_at': now,
+            'lease_expires_at': now + lease,
+            'attempts': PublishJob.attempts + 1,
+        },
+        order_by=(PublishJob.run_after, PublishJob.id),
+    )
+    db.session.commit()
+    return db.session.get(PublishJob, ids[0]) if ids else None
+
+
+def _heartbeat(app, job_id, post_id, owner, stop):
+    """Renew the job lease, and the lease of its in-flight ledger entries, until `stop` is set.
+
+    Runs on its own connection so it never touches the publishing session.
+    """
+    lease_seconds = app.config['PUBLISH_JOB_LEASE_SECONDS']
+    while not stop.wait(lease_seconds / 3):
+        now = datetime.now(timezone.utc)
+        expires = now + timedelta(seconds=lease_seconds)
+        try:
+            with app.app_context(), db.engine.begin() as conn:
+                conn.execute(
+                    update(PublishJob)
+                    .where(PublishJob.id == job_id, PublishJob.locked_by == owner)
+                    .values(heartbeat_at=now, lease_expires_at=expires)
+                )
+                conn.execute(
+                    update(PublishLedger)
+                    .where(PublishLedger.post_id == post_id, PublishLedger.locked_by == owner,
+                           PublishLedger.status == 'in_flight')
+                    .values(lease_expires_at=expires)
+                )
+        except Exception as e:
+            # A locked database or dropped connection must not end the
+            # heartbeat; the next renewal is well inside the lease.
+            print(f'Worker: heartbeat for publish job {job_id} failed, retrying: {e}')
+
+
+def _record_failure(job_id, error):
+    """Requeue a failed job with backoff, or fail it (and its post) once out of attempts."""
+    job = db.session.get(PublishJob, job_id)
+    job.last_error = error
+    if job.attempts >= current_app.config['PUBLISH_JOB_MAX_ATTEMPTS']:
+        job.status = 'failed'
+        job.finished_at = datetime.now(timezone.utc)
+        post = db.session.get(Post, job.post_id)
+        if post and post.status == 'publishing':
+            post.status = 'failed'
+    else:
+        job.status = 'queued'
+        job.run_after = datetime.now(timezone.utc) + timedelta(seconds=30 * 2 ** job.attempts)
+    job.lease_expires_at = None
+    db.session.commit()
+
+
+def run_job(job):
+    """Publish the job's post and record the outcome on the job."""
+    from app_package.services.publisher import publish_post
+
+    job_id, post_id = job.id, job.post_id
+    stop = threading.Event()
+    beat = threading.Thread(
+        target=_heartbeat,
+        args=(current_app._get_current_object(), job.id, job.post_id, job.locked_by, stop),
+        name=f'publish-job-{job.id}-heartbeat',
+        daemon=True,
+    )
+    beat.start()
+    lease_seconds = current_app.config['PUBLISH_JOB_LEASE_SECONDS']
+    try:
+        post = db.session.get(Post, job.post_id)
+        outcome = publish_post(post, owner=job.locked_by, lease_seconds=lease_seconds) if post else None
+        if outcome and outcome['in_flight']:
+            # Another worker holds some accounts; come back once its lease could have run out
+            job.status = 'queued'
+            job.run_after = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+        else:
+            job.status = 'done'
+            job.finished_at = datetime.now(timezone.utc)
+        job.lease_expires_at = None
+        job.last_error = None
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f'Worker: publish job {job_id} for post {post_id} failed: {e}')
+        try:
+            _record_failure(job_id, str(e))
+        except Exception as record_error:
+            # The lease runs out and the job is reclaimed, so nothing is lost
+            db.session.rollback()
+            print(f'Worker: could not record failure of publish job {job_id}: {record_error}')
+    finally:
+        stop.set()
+
+
+def work(stop=None, once=False):
+    """Claim and run jobs until `stop` is set (or the queue is drained when once=True)."""
+    owner = worker_id()
+    poll = current_app.config['WORKER_POLL_SECONDS']
+    while not (stop and stop.is_set()):
+        try:
+            job = claim_next(owner)
+            if job:
+                run_job(job)
+                continue
+        except Exception as e:
+            # A locked database or dropped connection must not stop the worker
+            print(f'Worker: job loop error, retrying in {poll}s: {e}')
+            db.session.rollback()
+            db.session.remove()
+        else:
+            db.session.remove()
+            if once:
+                return
+        if stop:
+            stop.wait(poll)
+        else:
+            time.sleep(poll)
@@ -1,9 +1,15 @@
 """LinkedIn API service — uses v2 endpoints for personal profile posting."""
-import requests
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import quote
 from flask import current_app
+from app_package import db
+from app_package.models import LinkedInAsset, MediaUpload
+from app_package.services import http_client, media
 
 API_URL = 'https://api.linkedin.com'
+VIDEO_PROCESSING_TIMEOUT = 300
 
 
 def get_auth_url(redirect_uri, state=''):
@@ -19,7 +25,7 @@ def get_auth_url(redirect_uri, state=''):
 
 def exchange_code(code, redirect_uri):
     """Exchange authorization code for access token."""
-    resp = requests.post('https://www.linkedin.com/oauth/v2/accessToken', data={
+    resp = http_client.post('linkedin', 'https://www.linkedin.com/oauth/v2/accessToken', data={
         'grant_type': 'authorization_code',
         'code': code,
         'redirect_uri': redirect_uri,
@@ -39,7 +45,7 @@ def exchange_code(code, redirect_uri):
 
 def refresh_access_token(refresh_token):
     """Refresh a LinkedIn access token."""
-    resp = requests.post('https://www.linkedin.com/oauth/v2/accessToken', data={
+    resp = http_client.post('linkedin', 'https://www.linkedin.com/oauth/v2/accessToken', data={
         'grant_type': 'refresh_token',
         'refresh_token': refresh_token,
         'client_id': current_app.config['LINKEDIN_CLIENT_ID'],
@@ -61,8 +67,8 @@ def _v2_headers(token):
 
 def get_user_profile(token):
     """Get the authenticated user's LinkedIn profile."""
-    resp = requests.get(
-        f'{API_URL}/v2/userinfo',
+    resp = http_client.get(
+        'linkedin', f'{API_URL}/v2/userinfo',
         headers={'Authorization': f'Bearer {token}'},
         timeout=15,
     )
@@ -79,8 +85,8 @@ def get_user_profile(token):
 
 def get_organization_pages(token):
     """Get organization pages the user administers."""
-    resp = requests.get(
-        f'{API_URL}/v2/organizationalEntityAcls',
+    resp = http_client.get(
+        'linkedin', f'{API_URL}/v2/organizationalEntityAcls',
         params={'q': 'roleAssignee', 'role': 'ADMINISTRATOR', 'state': 'APPROVED',
                 'projection': '(elements*(organizationalTarget))'},
         headers=_v2_headers(token),
@@ -102,8 +108,8 @@ def get_organization_pages(token):
 
 def get_organization_info(org_id, token):
     """Get organization details."""
-    resp = requests.get(
-        f'{API_URL}/v2/organizations/{org_id}',
+    resp = http_client.get(
+        'linkedin', f'{API_URL}/v2/organizations/{org_id}',
         headers=_v2_headers(token),
         timeout=15,
     )
@@ -139,8 +145,8 @@ def publish_text(author_urn, token, text):
             'com.linkedin.ugc.MemberNetworkVisibility': 'PUBLIC',
         },
     }
-    resp = requests.post(
-        f'{API_URL}/v2/ugcPosts',
+    resp = http_client.post(
+        'linkedin', f'{API_URL}/v2/ugcPosts',
         json=payload,
         headers=_v2_headers(token),
         timeout=30,
@@ -152,9 +158,12 @@ def publish_text(author_urn, token, text):
     raise Exception(data.get('message', f'Publish failed ({resp.status_code})'))
 
 
-def publish_image(author_urn, token, text, image_path):
-    """Upload image then publish post using UGC API (v2)."""
-    # Step 1: Register image upload
+# ugcPosts answers these when a (cached) asset no longer exists
+ASSET_GONE_STATUSES = (404, 410)
+
+
+def _upload_image(author_urn, token, image_path):
+    """Register an image upload and PUT the binary. Returns the asset URN, or None on failure."""
     register_payload = {
         'registerUploadRequest': {
             'recipes': ['urn:li:digitalmediaRecipe:feedshare-image'],
@@ -165,16 +174,15 @@ def publish_image(author_urn, token, text, image_path):
             }],
         }
     }
-    resp = requests.post(
-        f'{API_URL}/v2/assets?action=registerUpload',
+    resp = http_client.post(
+        'linkedin', f'{API_URL}/v2/assets?action=registerUpload',
         json=register_payload,
         headers=_v2_headers(token),
         timeout=15,
     )
     if resp.status_code not in (200, 201):
         print(f'[LinkedIn] Image register failed ({resp.status_code}): {resp.text}')
-        print('[LinkedIn] Falling back to text-only post')
-        return publish_text(author_urn, token, text)
+        return None
 
     upload_data = resp.json().get('value', {})
     upload_mechanism = upload_data.get('uploadMechanism', {})
@@ -184,19 +192,20 @@ def publish_image(author_urn, token, text, image_path):
     asset = upload_data.get('asset', '')
 
     if not upload_url:
-        print('[LinkedIn] No upload URL returned, falling back to text')
-        return publish_text(author_urn, token, text)
+        print('[LinkedIn] No upload URL returned')
+        return None
 
-    # Step 2: Upload binary
     with open(image_path, 'rb') as f:
-        resp = requests.put(upload_url, data=f, headers={
+        resp = http_client.put('linkedin', upload_url, data=f, headers={
             'Authorization': f'Bearer {token}',
         }, timeout=60)
     if resp.status_code not in (200, 201):
         print(f'[LinkedIn] Image upload failed ({resp.status_code}): {resp.text}')
-        return publish_text(author_urn, token, text)
+        return None
+    return asset
 
-    # Step 3: Create post with image
+
+def _create_image_post(author_urn, token, text, asset):
     payload = {
         'author': author_urn,
         'lifecycleState': 'PUBLISHED',
@@ -216,23 +225,223 @@ def publish_image(author_urn, token, text, image_path):
             'com.linkedin.ugc.MemberNetworkVisibility': 'PUBLIC',
         },
     }
-    resp = requests.post(
-        f'{API_URL}/v2/ugcPosts',
+    resp = http_client.post(
+        'linkedin', f'{API_URL}/v2/ugcPosts',
         json=payload,
         headers=_v2_headers(token),
         timeout=30,
     )
     print(f'[LinkedIn] publish_image status={resp.status_code} body={resp.text[:500]}')
+    return resp
+
+
+def _asset_rejected(resp, asset):
+    """True if a failed ugcPosts call refused the asset itself, rather than the rest of the post."""
+    if resp.status_code in ASSET_GONE_STATUSES:
+        return True
+    return 400 <= resp.status_code < 500 and asset in resp.text
+
+
+def _image_post_error(resp):
+    data = resp.json() if resp.content else {}
+    return Exception(data.get('message', f'Image post failed ({resp.status_code})'))
+
+
+def publish_image(author_urn, token, text, image_path):
+    """Upload image then publish post using UGC API (v2).
+
+    Assets are cached per image hash and owner (LinkedInAsset), so the same
+    image posted again by the same page skips registerUpload and the binary
+    upload. A cached asset LinkedIn rejects is dropped and uploaded afresh;
+    other errors (e.g. invalid text) leave the cache alone.
+    """
+    image_hash = media.source_digest(image_path)
+    asset = LinkedInAsset.lookup(image_hash, author_urn)
+    if asset:
+        resp = _create_image_post(author_urn, token, text, asset)
+        if resp.status_code in (200, 201):
+            return resp.json().get('id', '')
+        if not _asset_rejected(resp, asset):
+            raise _image_post_error(resp)
+        print(f'[LinkedIn] Cached asset {asset} rejected, uploading the image again')
+        LinkedInAsset.invalidate(image_hash, author_urn)
+
+    asset = _upload_image(author_urn, token, image_path)
+    if not asset:
+        print('[LinkedIn] Falling back to text-only post')
+        return publish_text(author_urn, token, text)
+    LinkedInAsset.store(image_hash, author_urn, asset)
+
+    resp = _create_image_post(author_urn, token, text, asset)
     if resp.status_code in (200, 201):
         return resp.json().get('id', '')
+    raise _image_post_error(resp)
+
+
+def _rest_headers(token):
+    return dict(_v2_headers(token), **{'LinkedIn-Version': current_app.config['LINKEDIN_API_VERSION']})
+
+
+def _rest_error(resp, what):
     data = resp.json() if resp.content else {}
-    raise Exception(data.get('message', f'Image post failed ({resp.status_code})'))
+    return media.UploadRejected(data.get('message', f'{what} failed ({resp.status_code})'))
+
+
+def _upload_part(app, token, video_path, part):
+    """Thread entry point: PUT one byte range of the video. Returns its ETag."""
+    with app.app_context():
+        chunk = media.read_chunk(video_path, part['first'], part['last'] - part['first'] + 1)
+        resp = http_client.put('linkedin', part['url'], data=chunk, headers={
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/octet-stream',
+        }, timeout=120)
+        if resp.status_code not in (200, 201):
+            raise _rest_error(resp, 'Video part upload')
+        return resp.headers.get('ETag', '')
+
+
+def _upload_video(author_urn, token, video_path, upload):
+    """Initialize, upload the missing parts of, and finalize `upload` (a MediaUpload)."""
+    if not upload.session_id:
+        resp = http_client.post(
+            'linkedin', f'{API_URL}/rest/videos?action=initializeUpload',
+            json={'initializeUploadRequest': {
+                'owner': author_urn,
+                'fileSizeBytes': upload.file_size,
+                'uploadCaptions': False,
+                'uploadThumbnail': False,
+            }},
+            headers=_rest_headers(token),
+            timeout=30,
+        )
+        if resp.status_code not in (200, 201):
+            raise _rest_error(resp, 'Video initializeUpload')
+        value = resp.json().get('value', {})
+        upload.session_id = value['video']
+        upload.upload_token = value.get('uploadToken', '')
+        upload.set_parts([
+            {'url': i['uploadUrl'], 'first': i['firstByte'], 'last': i['lastByte'], 'etag': None}
+            for i in value.get('uploadInstructions', [])
+        ])
+        db.session.commit()
+
+    # Parts are independent byte ranges, so they go up in parallel; each
+    # acknowledged part is saved at once so a retry only sends what is missing.
+    parts = upload.get_parts()
+    missing = [i for i, part in enumerate(parts) if not part['etag']]
+    if missing:
+        app = current_app._get_current_object()
+        workers = max(1, min(len(missing), current_app.config['VIDEO_UPLOAD_CONCURRENCY']))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='li-video') as pool:
+            futures = {pool.submit(_upload_part, app, token, video_path, parts[i]): i for i in missing}
+            errors = []
+            for future in as_completed(futures):
+                try:
+                    parts[futures[future]]['etag'] = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                upload.set_parts(parts)
+                db.session.commit()
+        if errors:
+            raise errors[0]
+
+    if upload.status != 'finalized':
+        resp = http_client.post(
+            'linkedin', f'{API_URL}/rest/videos?action=finalizeUpload',
+            json={'finalizeUploadRequest': {
+                'video': upload.session_id,
+                'uploadToken': upload.upload_token or '',
+                'uploadedPartIds': [part['etag'] for part in parts],
+            }},
+            headers=_rest_headers(token),
+            timeout=30,
+        )
+        if resp.status_code not in (200, 201):
+            raise _rest_error(resp, 'Video finalizeUpload')
+        upload.status = 'finalized'
+        db.session.commit()
+    return upload.session_id
+
+
+def _wait_for_video(video_urn, token, timeout=VIDEO_PROCESSING_TIMEOUT):
+    """Poll until LinkedIn has processed the video (status AVAILABLE)."""
+    delay = 1.0
+    deadline = time.monotonic() + timeout
+    while True:
+        resp = http_client.get(
+            'linkedin', f'{API_URL}/rest/videos/{quote(video_urn, safe="")}',
+            headers=_rest_headers(token),
+            timeout=15,
+        )
+        status = resp.json().get('status') if resp.status_code == 200 else None
+        if status == 'AVAILABLE':
+            return
+        if status == 'PROCESSING_FAILED':
+            raise Exception('LinkedIn could not process the video')
+        if time.monotonic() + delay > deadline:
+            raise Exception(f'LinkedIn video still processing after {timeout}s')
+        time.sleep(delay)
+        delay = min(delay * 2, 8)
+
+
+def publish_video(author_urn, token, text, video_path):
+    """Publish a video post via the multipart Videos API and the Posts API.
+
+    The file is read from disk one part at a time and parts are uploaded in
+    parallel (VIDEO_UPLOAD_CONCURRENCY). Upload progress is kept in
+    MediaUpload, so a retried publish skips parts LinkedIn already has; an
+    upload LinkedIn no longer accepts is dropped and started over once.
+    """
+    key = ('linkedin', author_urn, media.digest_of(video_path))
+    upload = MediaUpload.find(*key)
+    resumed = upload is not None
+    if upload is None:
+        upload = MediaUpload(platform='linkedin', owner=author_urn, file_hash=key[2],
+                             file_size=os.path.getsize(video_path))
+        db.session.add(upload)
+        db.session.commit()
+    try:
+        video_urn = _upload_video(author_urn, token, video_path, upload)
+    except media.UploadRejected as e:
+        if not resumed:
+            raise
+        print(f'[LinkedIn] Resuming video upload failed ({e}), starting over')
+        MediaUpload.discard(*key)
+        return publish_video(author_urn, token, text, video_path)
+
+    _wait_for_video(video_urn, token)
+    payload = {
+        'author': author_urn,
+        'commentary': text,
+        'visibility': 'PUBLIC',
+        'distribution': {
+            'feedDistribution': 'MAIN_FEED',
+            'targetEntities': [],
+            'thirdPartyDistributionChannels': [],
+        },
+        'content': {'media': {'id': video_urn}},
+        'lifecycleState': 'PUBLISHED',
+        'isReshareDisabledByAuthor': False,
+    }
+    resp = http_client.post(
+        'linkedin', f'{API_URL}/rest/posts',
+        json=payload,
+        headers=_rest_headers(token),
+        timeout=30,
+    )
+    print(f'[LinkedIn] publish_video status={resp.status_code} body={resp.text[:500]}')
+    if resp.status_code not in (200, 201):
+        data = resp.json() if resp.content else {}
+        raise Exception(data.get('message', f'Video post failed ({resp.status_code})'))
+    MediaUpload.discard(*key)
+    return resp.headers.get('x-restli-id', '')
 
 
 def get_post_comments(post_urn, token):
     """Get comments on a LinkedIn post."""
-    resp = requests.get(
-        f'{API_URL}/v2/socialActions/{post_urn}/comments',
+    resp = http_client.get(
+        'linkedin', f'{API_URL}/v2/socialActions/{post_urn}/comments',
         headers=_v2_headers(token),
         timeout=15,
     )
@@ -242,6 +451,22 @@ def get_post_comments(post_urn, token):
     return data.get('elements', [])
 
 
+def get_social_actions(post_urn, token):
+    """Like and comment counts of a LinkedIn post. Raises on API errors."""
+    resp = http_client.get(
+        'linkedin', f'{API_URL}/v2/socialActions/{quote(post_urn, safe="")}',
+        headers=_v2_headers(token),
+        timeout=15,
+    )
+    if resp.status_code != 200:
+        raise Exception(f'Failed to get social actions ({resp.status_code})')
+    data = resp.json()
+    return {
+        'likes': data.get('likesSummary', {}).get('totalLikes', 0),
+        'comments': data.get('commentsSummary', {}).get('aggregatedTotalComments', 0),
+    }
+
+
 def reply_to_comment(post_urn, token, message, parent_comment=None):
     """Reply to a comment on a LinkedIn post."""
     payload = {
@@ -250,8 +475,8 @@ def reply_to_comment(post_urn, token, message, parent_comment=None):
     }
     if parent_comment:
         payload['parentComment'] = parent_comment
-    resp = requests.post(
-        f'{API_URL}/v2/socialActions/{post_urn}/comments',
+    resp = http_client.post(
+        'linkedin', f'{API_URL}/v2/socialActions/{post_urn}/comments',
         json=payload,
         headers=_v2_headers(token),
         timeout=15,
@@ -263,8 +488,8 @@ def reply_to_comment(post_urn, token, message, parent_comment=None):
 
 def get_org_followers(org_id, token):
     """Get follower statistics for an organization."""
-    resp = requests.get(
-        f'{API_URL}/v2/organizationalEntityFollowerStatistics',
+    resp = http_client.get(
+        'linkedin', f'{API_URL}/v2/organizationalEntityFollowerStatistics',
         params={'q': 'organizationalEntity', 'organizationalEntity': f'urn:li:organization:{org_id}'},
         headers=_v2_headers(token),
         timeout=15,
@@ -278,8 +503,8 @@ def get_org_followers(org_id, token):
 
 def get_share_statistics(org_id, token):
     """Get share/post statistics for an organization."""
-    resp = requests.get(
-        f'{API_URL}/v2/organizationalEntityShareStatistics',
+    resp = http_client.get(
+        'linkedin', f'{API_URL}/v2/organizationalEntityShareStatistics',
         params={'q': 'organizationalEntity', 'organizationalEntity': f'urn:li:organization:{org_id}'},
         headers=_v2_headers(token),
         timeout=15,
@@ -0,0 +1,260 @@
+"""Content-addressed upload store and per-platform image variants.
+
+Uploads are stored once per unique file as UPLOAD_FOLDER/<sha256>.<ext>;
+the hash is computed while the request body is written, so re-using the
+same logo or banner across posts costs no extra disk. Posts reference
+blobs through Post.image, and collect_garbage() removes blobs no post
+references any more (after MEDIA_GC_GRACE_SECONDS, so a file uploaded
+for a post that is still being saved is never collected).
+
+Each platform gets a JPEG resized to what it actually displays, with EXIF
+applied to the pixels and then stripped. Instagram's variant is also
+centre-cropped into its allowed aspect range (4:5 to 1.91:1). Variants
+are cached under UPLOAD_FOLDER/variants keyed by the original's content
+hash, so the same picture reused across posts is only processed once.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from flask import abort, current_app, send_file
+from PIL import Image, ImageOps
+from werkzeug.security import safe_join
+from app_package import db
+from app_package.models import Post
+
+VARIANT_DIR = 'variants'
+VIDEO_EXTENSIONS = {'mp4', 'mov'}
+CONTENT_NAME = re.compile(r'^([0-9a-f]{64})\.[a-z0-9]+$')
+VARIANT_NAME = re.compile(r'^([0-9a-f]{64})_[a-z]+\.jpg$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+VARIANT_SPECS = {
+    'facebook': {'max_side': 2048, 'quality': 85},
+    'instagram': {'max_side': 1440, 'max_width': 1080, 'aspect': (4 / 5, 1.91), 'quality': 90},
+    'linkedin': {'max_side': 1920, 'quality': 85},
+}
+
+
+class UploadRejected(Exception):
+    """The platform refused a step of a chunked upload (as opposed to a network failure)."""
+
+
+def is_video(path):
+    return path.rsplit('.', 1)[-1].lower() in VIDEO_EXTENSIONS
+
+
+def read_chunk(path, offset, size):
+    """Read at most `size` bytes of a file starting at `offset`."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def digest_of(path):
+    """Content hash of a stored file, read from its name when content-addressed."""
+    match = CONTENT_NAME.match(os.path.basename(path))
+    return match.group(1) if match else file_hash(path)
+
+
+def source_digest(path):
+    """Content hash of the upload `path` is, or is a platform variant of, without re-reading it."""
+    match = VARIANT_NAME.match(os.path.basename(path))
+    return match.group(1) if match else digest_of(path)
+
+
+def store_upload(file, ext):
+    """Save an uploaded FileStorage under its SHA-256 and return the stored path.
+
+    An identical file already in the store is reused instead of written again.
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        path = os.path.join(folder, f'{digest.hexdigest()}.{ext}')
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            os.utime(path)  # restart the GC grace period for the new reference
+        else:
+            os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def collect_garbage(grace_seconds=None):
+    """Delete blobs no post references, and variants whose original is gone.
+
+    Only content-addressed files older than the grace period are touched;
+    legacy uploads with random names are left alone. Returns the number of
+    files removed.
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    if grace_seconds is None:
+        grace_seconds = current_app.config['MEDIA_GC_GRACE_SECONDS']
+    if not os.path.isdir(folder):
+        return 0
+    cutoff = time.time() - grace_seconds
+    referenced = {
+        image.replace('\\', '/').split('/')[-1]
+        for (image,) in db.session.query(Post.image).filter(Post.image.isnot(None))
+    }
+
+    def expired(path):
+        try:
+            return os.path.getmtime(path) < cutoff
+        except OSError:
+            return False
+
+    removed = 0
+    live = set()
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        match = CONTENT_NAME.match(name)
+        if match and (name in referenced or not expired(path)):
+            live.add(match.group(1))
+            continue
+        if match or (name.endswith('.upload') and expired(path)):
+            os.remove(path)
+            removed += 1
+
+    variant_dir = os.path.join(folder, VARIANT_DIR)
+    if os.path.isdir(variant_dir):
+        for name in os.listdir(variant_dir):
+            match = VARIANT_NAME.match(name)
+            path = os.path.join(variant_dir, name)
+            # Variants of legacy uploads are dropped too; variant_for rebuilds them on demand
+            if match and match.group(1) not in live and expired(path):
+                os.remove(path)
+                removed += 1
+    if removed:
+        print(f'[Media] garbage collected {removed} unreferenced files')
+    return removed
+
+
+def _variant_path(digest, platform):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], VARIANT_DIR, f'{digest}_{platform}.jpg')
+
+
+def _crop_to_aspect(im, lowest, highest):
+    """Centre-crop so width/height falls within [lowest, highest]."""
+    width, height = im.size
+    ratio = width / height
+    if ratio > highest:
+        new_width = int(height * highest)
+        left = (width - new_width) // 2
+        return im.crop((left, 0, left + new_width, height))
+    if ratio < lowest:
+        new_height = int(width / lowest)
+        top = (height - new_height) // 2
+        return im.crop((0, top, width, top + new_height))
+    return im
+
+
+def _render(src_path, dest_path, spec):
+    with Image.open(src_path) as im:
+        if getattr(im, 'is_animated', False):
+            return False  # keep animated GIF/WebP as uploaded
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ('RGBA', 'LA', 'P'):
+            im = im.convert('RGBA')
+            background = Image.new('RGB', im.size, (255, 255, 255))
+            background.paste(im, mask=im.getchannel('A'))
+            im = background
+        elif im.mode != 'RGB':
+            im = im.convert('RGB')
+        if 'aspect' in spec:
+            im = _crop_to_aspect(im, *spec['aspect'])
+        im.thumbnail((spec['max_side'], spec['max_side']), Image.LANCZOS)
+        if spec.get('max_width') and im.width > spec['max_width']:
+            im = im.resize((spec['max_width'], round(im.height * spec['max_width'] / im.width)), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f'{dest_path}.{os.getpid()}.tmp'
+        # No exif= argument: metadata (GPS, camera serials) is dropped
+        im.save(tmp_path, 'JPEG', quality=spec['quality'], optimize=True, progressive=True)
+        os.replace(tmp_path, dest_path)
+    return True
+
+
+def variant_for(image_path, platform, digest=None):
+    """Path of the platform's variant of `image_path`, creating it if needed.
+
+    Falls back to the original upload if the image can't be processed, so
+    publishing never fails because of the pipeline.
+    """
+    spec = VARIANT_SPECS.get(platform)
+    if not spec or not image_path or is_video(image_path):
+        return image_path
+    try:
+        dest = _variant_path(digest or digest_of(image_path), platform)
+        if os.path.exists(dest) or _render(image_path, dest, spec):
+            return dest
+    except Exception as e:
+        print(f'[Media] could not build {platform} variant of {image_path}: {e}')
+    return image_path
+
+
+def prepare_variants(image_path):
+    """Build every platform variant of a fresh upload. Returns {platform: path}."""
+    if is_video(image_path):
+        return {}
+    digest = digest_of(image_path)
+    return {platform: variant_for(image_path, platform, digest) for platform in VARIANT_SPECS}
+
+
+def serve_upload(filename):
+    """Response for GET /uploads/<filename>.
+
+    Content-addressed blobs and variants never change, so they get their hash
+    as a strong ETag and an immutable, year-long Cache-Control. Conditional
+    and Range requests are answered by send_file. With UPLOADS_OFFLOAD set,
+    the bytes are streamed by the front proxy instead of a gunicorn worker:
+
+    - 'x-sendfile' (Apache mod_xsendfile, lighttpd): Flask's USE_X_SENDFILE.
+    - 'x-accel-redirect' (nginx): needs an internal location serving
+      UPLOAD_FOLDER at UPLOADS_ACCEL_PREFIX, e.g.
+      ``location /protected-uploads/ { internal; alias /app/uploads/; }``
+    """
+    config = current_app.config
+    path = safe_join(config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    name = os.path.basename(path)
+    immutable = bool(CONTENT_NAME.match(name) or VARIANT_NAME.match(name))
+
+    if config['UPLOADS_OFFLOAD'] == 'x-accel-redirect':
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = (
+            config['UPLOADS_ACCEL_PREFIX'].rstrip('/') + '/' + filename.replace('\\', '/').lstrip('/'))
+    else:
+        response = send_file(
+            path,
+            etag=name.rsplit('.', 1)[0] if immutable else True,
+            max_age=IMMUTABLE_MAX_AGE if immutable else None,
+            conditional=True,
+        )
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
@@ -0,0 +1,165 @@
+"""Background refresh of PostResult engagement counters.
+
+Every METRICS_REFRESH_TICK_SECONDS the scheduler calls run_refresh(). A
+post is due when its counters are older than its tier in REFRESH_TIERS:
+young posts, whose numbers still move, are read often and older ones more
+and more rarely; posts older than the last tier are left alone. At most
+METRICS_REFRESH_MAX_POSTS are read per run, least recently refreshed
+first, so the API cost of a run is bounded whatever the backlog.
+
+Due posts are grouped by platform and access token. Facebook and
+Instagram counters come from multi-id ?ids= lookups of up to
+fb_svc.BATCH_LIMIT posts per call, and their insights from batch calls in
+which a post without insights fails alone; LinkedIn has no such lookup and
+is read one post per call. Calls run concurrently (METRICS_REFRESH_MAX_WORKERS
+threads, at most METRICS_REFRESH_PER_PLATFORM per platform), and the
+counters read are written back with one bulk UPDATE per run. Every reading
+is also appended to the engagement time series (services/snapshots).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from app_package import db
+from app_package.models import PostResult, SocialAccount
+from app_package.services import facebook as fb_svc, instagram as ig_svc, linkedin as li_svc, snapshots
+
+REFRESHED_PLATFORMS = ('facebook', 'instagram', 'linkedin')
+# (published within, refresh at most every)
+REFRESH_TIERS = [
+    (timedelta(hours=6), timedelta(minutes=15)),
+    (timedelta(hours=48), timedelta(hours=1)),
+    (timedelta(days=7), timedelta(hours=6)),
+    (timedelta(days=30), timedelta(days=1)),
+    (timedelta(days=90), timedelta(days=7)),
+]
+# Posts read per API call
+BATCH_SIZES = {'facebook': fb_svc.BATCH_LIMIT, 'instagram': fb_svc.BATCH_LIMIT, 'linkedin': 1}
+# Counter returned by the services -> PostResult column
+COUNTER_COLUMNS = {'likes': 'likes_count', 'comments': 'comments_count', 'shares': 'shares_count'}
+
+
+def due_results(now=None, limit=None):
+    """Successful PostResults whose counters are due for a refresh, least recently refreshed first.
+
+    The tier checks run in SQL: since intervals grow with the tiers, a post
+    is due when any tier it was published within has an interval that has
+    passed since its last refresh.
+    """
+    now = now or datetime.now(timezone.utc)
+    if limit is None:
+        limit = current_app.config['METRICS_REFRESH_MAX_POSTS']
+    refreshed = PostResult.metrics_refreshed_at
+    return db.session.query(PostResult).filter(
+        PostResult.status == 'success',
+        PostResult.published_at >= now - REFRESH_TIERS[-1][0],
+        PostResult.platform.in_(REFRESHED_PLATFORMS),
+        PostResult.platform_post_id.isnot(None),
+        or_(
+            refreshed.is_(None),
+            *(and_(PostResult.published_at >= now - published_within, refreshed <= now - interval)
+              for published_within, interval in REFRESH_TIERS),
+        ),
+    ).order_by(refreshed.isnot(None), refreshed, PostResult.id).limit(limit).all()
+
+
+def _batches(results):
+    """Split results into (platform, token, {platform_post_id: (post_result_id, account_id)}) API calls."""
+    accounts = {
+        a.id: a for a in db.session.query(SocialAccount).filter(
+            SocialAccount.id.in_({r.social_account_id for r in results})).all()
+    } if results else {}
+    groups = {}
+    for result in results:
+        account = accounts.get(result.social_account_id)
+        if not account or not account.is_active:
+            continue
+        groups.setdefault((result.platform, account.access_token), {})[result.platform_post_id] = (
+            result.id, account.id)
+    batches = []
+    for (platform, token), ids in groups.items():
+        items = list(ids.items())
+        size = BATCH_SIZES[platform]
+        batches.extend((platform, token, dict(items[i:i + size])) for i in range(0, len(items), size))
+    return batches
+
+
+def _fetch_in_thread(app, semaphore, platform, token, post_ids):
+    """Thread entry point: {platform_post_id: counters} for one batch, or the exception raised."""
+    with app.app_context(), semaphore:
+        try:
+            if platform == 'facebook':
+                return fb_svc.get_posts_insights(post_ids, token)
+            if platform == 'instagram':
+                return ig_svc.get_medias_engagement(post_ids, token)
+            return {urn: li_svc.get_social_actions(urn, token) for urn in post_ids}
+        except Exception as e:
+            return e
+
+
+def _write_counters(rows):
+    """Bulk UPDATE PostResult counters; rows are dicts keyed by id and column name."""
+    by_columns = {}
+    for row in rows:
+        by_columns.setdefault(tuple(sorted(row)), []).append(row)
+    for group in by_columns.values():
+        db.session.execute(update(PostResult), group)
+    db.session.commit()
+
+
+def refresh_results(results):
+    """Read and store current engagement counters for PostResults.
+
+    Returns {'refreshed': count, 'failed': [(platform, error), ...]}.
+    """
+    app = current_app._get_current_object()
+    config = app.config
+    batches = _batches(results)
+    summary = {'refreshed': 0, 'failed': []}
+    if not batches:
+        return summary
+
+    semaphores = {platform: threading.BoundedSemaphore(config['METRICS_REFRESH_PER_PLATFORM'])
+                  for platform in REFRESHED_PLATFORMS}
+    now = datetime.now(timezone.utc)
+    rows, samples = [], []
+    workers = max(1, min(len(batches), config['METRICS_REFRESH_MAX_WORKERS']))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='metrics') as pool:
+        futures = {
+            pool.submit(_fetch_in_thread, app, semaphores[platform], platform, token, list(ids)): (platform, ids)
+            for platform, token, ids in batches
+        }
+        for future in as_completed(futures):
+            platform, ids = futures[future]
+            counters = future.result()
+            if isinstance(counters, Exception):
+                print(f'[Metrics] {platform} batch of {len(ids)} failed: {counters}')
+                summary['failed'].append((platform, str(counters)))
+                continue
+            for platform_post_id, (result_id, account_id) in ids.items():
+                # Posts the API no longer returns (deleted) are marked refreshed with their last counts
+                row = {'id': result_id, 'metrics_refreshed_at': now}
+                for key, value in counters.get(platform_post_id, {}).items():
+                    if key in COUNTER_COLUMNS:
+                        row[COUNTER_COLUMNS[key]] = value or 0
+                rows.append(row)
+                if platform_post_id in counters:
+                    samples.append(dict(counters[platform_post_id], post_result_id=result_id,
+                                        social_account_id=account_id))
+
+    if rows:
+        _write_counters(rows)
+        snapshots.capture(samples, now)
+    summary['refreshed'] = len(rows)
+    return summary
+
+
+def run_refresh():
+    """Scheduler entry point: refresh the counters of the posts that are due."""
+    results = due_results()
+    if not results:
+        return
+    outcome = refresh_results(results)
+    print(f"[Metrics] refreshed {outcome['refreshed']} of {len(results)} post(s), "
+          f"{len(outcome['failed'])} batch(es) failed")
@@ -0,0 +1,285 @@
+"""Fan-out publisher — sends one post to every selected social account concurrently."""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from app_package import db
+from app_package.models import SocialAccount, PostResult, PublishLedger
+from app_package.services.sql import insert
+from app_package.services import facebook as fb_svc, instagram as ig_svc, linkedin as li_svc, media
+
+
+def account_target(account):
+    """Snapshot the account fields a publisher thread needs.
+
+    Publisher threads only see these plain dicts, so the SQLAlchemy session
+    is never shared across threads.
+    """
+    return {
+        'id': account.id,
+        'platform': account.platform,
+        'name': account.account_name,
+        'page_id': account.page_id,
+        'access_token': account.access_token,
+        'ig_user_id': account.get_extra('ig_user_id') or account.platform_account_id,
+        'author_urn': account.get_extra('org_urn') or f'urn:li:person:{account.platform_account_id}',
+    }
+
+
+def public_image_url(image_path):
+    """IG requires a public image URL; for local dev use the BASE_URL."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    relative = os.path.relpath(image_path, upload_folder).replace(os.sep, '/')
+    if relative.startswith('..'):
+        relative = os.path.basename(image_path)
+    return current_app.config['BASE_URL'] + '/uploads/' + relative
+
+
+def publish_to_account(target, content, image_path=None):
+    """Publish to a single account. Returns the platform post id, raises on failure.
+
+    Images are sent as the platform's preprocessed variant (see services/media).
+    """
+    platform = target['platform']
+    token = target['access_token']
+    if image_path and media.is_video(image_path):
+        return _publish_video(target, content, image_path)
+    image = media.variant_for(image_path, platform) if image_path else None
+
+    if platform == 'facebook':
+        if image:
+            return fb_svc.publish_photo(target['page_id'], token, content, image)
+        return fb_svc.publish_text(target['page_id'], token, content)
+
+    if platform == 'instagram':
+        if not image:
+            raise ValueError('Instagram requires an image to publish.')
+        return ig_svc.publish_photo(target['ig_user_id'], token, public_image_url(image), content)
+
+    if platform == 'linkedin':
+        if image:
+            return li_svc.publish_image(target['author_urn'], token, content, image)
+        return li_svc.publish_text(target['author_urn'], token, content)
+
+    raise ValueError(f'Unsupported platform: {platform}')
+
+
+def _publish_video(target, content, video_path):
+    platform = target['platform']
+    if platform == 'facebook':
+        return fb_svc.publish_video(target['page_id'], target['access_token'], content, video_path)
+    if platform == 'linkedin':
+        return li_svc.publish_video(target['author_urn'], target['access_token'], content, video_path)
+    if platform == 'instagram':
+        raise ValueError('Video posts are not supported on Instagram yet.')
+    raise ValueError(f'Unsupported platform: {platform}')
+
+
+def _publish_in_thread(app, target, content, image_path):
+    """Thread entry point: returns (platform_post_id, error, finished_at)."""
+    with app.app_context():
+        try:
+            platform_post_id = publish_to_account(target, content, image_path)
+            return platform_post_id, None, datetime.now(timezone.utc)
+        except Exception as e:
+            return None, str(e), datetime.now(timezone.utc)
+
+
+def _publish_instagram_in_thread(app, targets, content, image_path):
+    """Thread entry point for all Instagram targets of a post at once."""
+    with app.app_context():
+        image_url = public_image_url(media.variant_for(image_path, 'instagram'))
+        items = [(t['ig_user_id'], t['access_token'], image_url, content) for t in targets]
+        try:
+            results = ig_svc.publish_photos(items)
+        except Exception as e:
+            results = [e] * len(targets)
+        finished_at = datetime.now(timezone.utc)
+        return [
+            (None, str(r), finished_at) if isinstance(r, Exception) else (r, None, finished_at)
+            for r in results
+        ]
+
+
+def content_hash(post):
+    """Hash of what actually gets published: the text plus the image's content hash.
+
+    Stored uploads are content-addressed, so the image hash comes from the
+    file name; only legacy uploads are read.
+    """
+    digest = hashlib.sha256((post.content or '').encode())
+    if post.image and os.path.exists(post.image):
+        digest.update(b'\0' + media.digest_of(post.image).encode())
+    return digest.hexdigest()
+
+
+def _claim_ledger(post_id, account_ids, digest, owner=None, lease_seconds=None):
+    """Mark accounts in-flight in the publish ledger; return the ids this caller may publish to.
+
+    An account is claimed when it has no entry yet, its last attempt failed,
+    or the lease of an earlier in-flight attempt has expired (its worker
+    crashed). Successes and live in-flight attempts are skipped. Claimed
+    entries are leased for `lease_seconds` (PUBLISH_INFLIGHT_TIMEOUT_SECONDS
+    by default); publish jobs pass their own lease and renew it from the
+    job heartbeat.
+    """
+    now = datetime.now(timezone.utc)
+    if lease_seconds is None:
+        lease_seconds = current_app.config['PUBLISH_INFLIGHT_TIMEOUT_SECONDS']
+    lease_expires_at = now + timedelta(seconds=lease_seconds)
+    # Entries written before leases existed expire PUBLISH_INFLIGHT_TIMEOUT_SECONDS after they started
+    stale = now - timedelta(seconds=current_app.config['PUBLISH_INFLIGHT_TIMEOUT_SECONDS'])
+    key = ('post_id', 'social_account_id', 'content_hash')
+
+    # Results recorded before the ledger existed count as successes
+    legacy = db.session.query(PostResult.social_account_id, PostResult.platform_post_id).filter(
+        PostResult.post_id == post_id,
+        PostResult.social_account_id.in_(account_ids),
+        PostResult.status == 'success',
+    ).all() if account_ids else []
+    for account_id, platform_post_id in legacy:
+        db.session.execute(
+            insert(PublishLedger.__table__)
+            .values(post_id=post_id, social_account_id=account_id, content_hash=digest,
+                    status='success', platform_post_id=platform_post_id, started_at=now, finished_at=now)
+            .on_conflict_do_nothing(index_elements=key)
+        )
+
+    claimed = []
+    for account_id in account_ids:
+        inserted = db.session.execute(
+            insert(PublishLedger.__table__)
+            .values(post_id=post_id, social_account_id=account_id, content_hash=digest,
+                    status='in_flight', locked_by=owner, lease_expires_at=lease_expires_at, started_at=now)
+            .on_conflict_do_nothing(index_elements=key)
+        )
+        if inserted.rowcount == 1:
+            claimed.append(account_id)
+            continue
+        retried = db.session.execute(
+            update(PublishLedger)
+            .where(
+                PublishLedger.post_id == post_id,
+                PublishLedger.social_account_id == account_id,
+                PublishLedger.content_hash == digest,
+                or_(
+                    PublishLedger.status == 'failed',
+                    and_(PublishLedger.status == 'in_flight', PublishLedger.lease_expires_at < now),
+                    and_(PublishLedger.status == 'in_flight', PublishLedger.lease_expires_at.is_(None),
+                         PublishLedger.started_at < stale),
+                ),
+            )
+            .values(status='in_flight', locked_by=owner, lease_expires_at=lease_expires_at,
+                    started_at=now, finished_at=None)
+        )
+        if retried.rowcount == 1:
+            claimed.append(account_id)
+    db.session.commit()
+    return claimed
+
+
+def publish_post(post, account_ids=None, owner=None, lease_seconds=None, update_status=True):
+    """Publish a post to its selected accounts (or just `account_ids`) at once.
+
+    Accounts the ledger shows as already published, or being published by
+    another worker, are skipped, so retries, republish and scheduler
+    restarts only hit accounts that still need the post. Every published
+    account gets its own PostResult; all results, ledger entries and the
+    post status are written in a single commit once the slowest platform
+    has answered. `owner` and `lease_seconds` identify and lease the
+    ledger claims (see _claim_ledger). With `update_status` False the
+    post status is left alone, so sharing a scheduled or publishing post
+    to one page does not decide the fate of the whole post.
+
+    Returns {'success': [...], 'failed': [...], 'skipped': [...], 'in_flight': [...]}
+    lists of account targets; failed targets carry an 'error'. `in_flight`
+    are the skipped accounts another worker is still publishing to.
+    """
+    app = current_app._get_current_object()
+    if account_ids is None:
+        account_ids = post.get_platform_ids()
+    accounts = {
+        a.id: a for a in
+        db.session.query(SocialAccount).filter(SocialAccount.id.in_(account_ids)).all()
+    } if account_ids else {}
+    active = [acc_id for acc_id in account_ids if acc_id in accounts and accounts[acc_id].is_active]
+
+    digest = content_hash(post)
+    claimed = set(_claim_ledger(post.id, active, digest, owner, lease_seconds))
+    targets = [account_target(accounts[acc_id]) for acc_id in active if acc_id in claimed]
+    outcome = {
+        'success': [],
+        'failed': [],
+        'skipped': [account_target(accounts[acc_id]) for acc_id in active if acc_id not in claimed],
+        'in_flight': [],
+    }
+    # Instagram targets share one thread so their media containers are
+    # processed in parallel and polled cooperatively.
+    instagram = [i for i, t in enumerate(targets)
+                 if t['platform'] == 'instagram' and post.image and not post.is_video]
+    others = [i for i in range(len(targets)) if i not in instagram]
+
+    outcomes = [None] * len(targets)
+    if targets:
+        workers = max(1, min(len(others) + bool(instagram), app.config['PUBLISH_MAX_WORKERS']))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='publish') as pool:
+            futures = {
+                i: pool.submit(_publish_in_thread, app, targets[i], post.content, post.image)
+                for i in others
+            }
+            if instagram:
+                ig_future = pool.submit(_publish_instagram_in_thread, app,
+                                        [targets[i] for i in instagram], post.content, post.image)
+            for i, future in futures.items():
+                outcomes[i] = future.result()
+            if instagram:
+                for i, ig_outcome in zip(instagram, ig_future.result()):
+                    outcomes[i] = ig_outcome
+
+    for target, (platform_post_id, error, finished_at) in zip(targets, outcomes):
+        result = PostResult(
+            post_id=post.id,
+            social_account_id=target['id'],
+            platform=target['platform'],
+        )
+        if error is None:
+            result.platform_post_id = platform_post_id
+            result.status = 'success'
+            result.published_at = finished_at
+            outcome['success'].append(target)
+        else:
+            result.status = 'failed'
+            result.error_message = error
+            outcome['failed'].append(dict(target, error=error))
+        db.session.add(result)
+        db.session.query(PublishLedger).filter_by(
+            post_id=post.id, social_account_id=target['id'], content_hash=digest,
+        ).update({
+            'status': result.status,
+            'platform_post_id': platform_post_id,
+            'finished_at': finished_at,
+        }, synchronize_session=False)
+
+    skipped_ids = [t['id'] for t in outcome['skipped']]
+    in_flight_ids = {account_id for (account_id,) in db.session.query(PublishLedger.social_account_id).filter(
+        PublishLedger.post_id == post.id,
+        PublishLedger.content_hash == digest,
+        PublishLedger.status == 'in_flight',
+        PublishLedger.social_account_id.in_(skipped_ids),
+    )} if skipped_ids else set()
+    outcome['in_flight'] = [t for t in outcome['skipped'] if t['id'] in in_flight_ids]
+
+    already_published = db.session.query(PostResult.id).filter_by(
+        post_id=post.id, status='success').first() is not None
+    in_flight_elsewhere = bool(in_flight_ids) and not already_published
+    if not update_status:
+        pass
+    elif outcome['success'] or already_published:
+        post.status = 'published'
+        post.published_at = post.published_at or datetime.now(timezone.utc)
+    elif not in_flight_elsewhere and post.status != 'draft':
+        post.status = 'failed'
+    db.session.commit()
+    return outcome
@@ -0,0 +1,231 @@
+"""Per-platform, per-account token-bucket rate limiting.
+
+Every outbound call takes a token from two buckets: one for the whole app
+on that platform and one for the calling account (keyed by a hash of its
+access token). Meta reports how much of its quota we have used in the
+X-App-Usage and X-Business-Use-Case-Usage headers; once usage passes
+RATE_LIMIT_SLOWDOWN_AT the buckets refill proportionally slower, and at
+100% (or on HTTP 429) callers wait until access is regained.
+
+Usage and block state are mirrored to the rate_limit_states table, so all
+worker processes slow down together rather than each discovering the limit
+on its own.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from flask import current_app
+from sqlalchemy import select
+from app_package import db
+from app_package.models import RateLimitState
+from app_package.services.sql import insert
+
+# Facebook and Instagram share one Meta app quota
+PLATFORM_GROUPS = {'facebook': 'meta', 'instagram': 'meta', 'linkedin': 'linkedin'}
+
+# (refill per second, burst)
+BUCKET_RATES = {
+    'app': (10.0, 20),
+    'account': (3.0, 10),
+}
+
+# Meta usage is a rolling one-hour window; ignore readings older than this
+USAGE_TTL = 600
+# How long to back off at 100% usage when Meta gives no regain estimate
+FULL_USAGE_BLOCK = 60
+
+
+class RateLimited(Exception):
+    """The platform has blocked us for longer than RATE_LIMIT_MAX_WAIT."""
+
+
+def account_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:16] if token else 'anonymous'
+
+
+def _usage_pct(stats):
+    return max(float(stats.get(k) or 0) for k in ('call_count', 'total_time', 'total_cputime'))
+
+
+def parse_usage_headers(headers):
+    """Return (app_usage, account_usage, regain_seconds) from Meta usage headers."""
+    app_usage = account_usage = None
+    regain = 0
+    raw = headers.get('X-App-Usage')
+    if raw:
+        try:
+            app_usage = _usage_pct(json.loads(raw))
+        except (ValueError, TypeError, AttributeError):
+            pass
+    raw = headers.get('X-Business-Use-Case-Usage')
+    if raw:
+        try:
+            for entries in json.loads(raw).values():
+                for entry in entries:
+                    account_usage = max(account_usage or 0, _usage_pct(entry))
+                    regain = max(regain, 60 * float(entry.get('estimated_time_to_regain_access') or 0))
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return app_usage, account_usage, regain
+
+
+def retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP-date); None if unparseable."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class _Bucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.usage = 0.0
+        self.usage_at = 0.0
+        self.blocked_until = 0.0
+        self.synced_at = 0.0
+        self.written = (None, None, 0.0)  # (usage, blocked_until, when)
+
+    def current_usage(self):
+        return self.usage if time.time() - self.usage_at < USAGE_TTL else 0.0
+
+    def refill_rate(self, slowdown_at):
+        usage = self.current_usage()
+        if usage <= slowdown_at:
+            return self.rate
+        headroom = max(0.0, 100 - usage) / (100 - slowdown_at)
+        return max(self.rate * headroom, self.rate * 0.05)
+
+    def reserve(self, slowdown_at):
+        """Take a token; return how many seconds to wait before using it."""
+        now = time.monotonic()
+        rate = self.refill_rate(slowdown_at)
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * rate)
+        self.stamp = now
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / rate
+        return max(wait, self.blocked_until - time.time())
+
+
+class RateLimiter:
+    """Thread-safe registry of buckets keyed by (platform group, bucket key)."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, group, key):
+        bucket = self._buckets.get((group, key))
+        if bucket is None:
+            rate, burst = BUCKET_RATES['app' if key == 'app' else 'account']
+            bucket = self._buckets[(group, key)] = _Bucket(rate, burst)
+        return bucket
+
+    def acquire(self, platform, token=None):
+        """Block until a call for this platform/account may go out."""
+        group = PLATFORM_GROUPS.get(platform, platform)
+        config = current_app.config
+        keys = ('app', account_key(token))
+        for key in keys:
+            self._pull(group, key)
+        with self._lock:
+            wait = max(self._bucket(group, key).reserve(config['RATE_LIMIT_SLOWDOWN_AT']) for key in keys)
+        if wait > config['RATE_LIMIT_MAX_WAIT']:
+            raise RateLimited(f'{platform} rate limit reached, retry in {int(wait)}s')
+        if wait > 0:
+            time.sleep(wait)
+
+    def observe(self, platform, token, response):
+        """Update bucket state from a platform response."""
+        group = PLATFORM_GROUPS.get(platform, platform)
+        app_usage, account_usage, regain = parse_usage_headers(response.headers)
+        if response.status_code == 429:
+            account_usage = max(account_usage or 0, 100)
+            regain = max(regain, retry_after_seconds(response.headers.get('Retry-After')) or FULL_USAGE_BLOCK)
+
+        updates = {}
+        if app_usage is not None:
+            updates['app'] = (app_usage, FULL_USAGE_BLOCK if app_usage >= 100 else 0)
+        if account_usage is not None:
+            updates[account_key(token)] = (
+                account_usage, regain or (FULL_USAGE_BLOCK if account_usage >= 100 else 0))
+
+        now = time.time()
+        for key, (usage, block_for) in updates.items():
+            with self._lock:
+                bucket = self._bucket(group, key)
+                bucket.usage = usage
+                bucket.usage_at = now
+                if block_for:
+                    bucket.blocked_until = max(bucket.blocked_until, now + block_for)
+            self._push(group, key, bucket)
+
+    def _pull(self, group, key):
+        """Merge state written by other processes, at most every RATE_LIMIT_SYNC_SECONDS."""
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(group, key)
+            if now - bucket.synced_at < current_app.config['RATE_LIMIT_SYNC_SECONDS']:
+                return
+            bucket.synced_at = now
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    select(RateLimitState.usage_pct, RateLimitState.blocked_until, RateLimitState.updated_at)
+                    .where(RateLimitState.platform == group, RateLimitState.bucket_key == key)
+                ).first()
+        except Exception as e:
+            print(f'[RateLimit] could not read shared state: {e}')
+            return
+        if not row:
+            return
+        usage, blocked_until, updated_at = row
+        with self._lock:
+            if updated_at:
+                updated = updated_at.replace(tzinfo=timezone.utc).timestamp()
+                if updated > bucket.usage_at:
+                    bucket.usage = usage or 0.0
+                    bucket.usage_at = updated
+            if blocked_until:
+                bucket.blocked_until = max(
+                    bucket.blocked_until, blocked_until.replace(tzinfo=timezone.utc).timestamp())
+
+    def _push(self, group, key, bucket):
+        """Share a meaningful change (>=5 points, new block, or a minute old) with other processes."""
+        last_usage, last_blocked, last_at = bucket.written
+        now = time.time()
+        if (last_usage is not None and abs(bucket.usage - last_usage) < 5
+                and bucket.blocked_until == last_blocked and now - last_at < 60):
+            return
+        bucket.written = (bucket.usage, bucket.blocked_until, now)
+        values = {
+            'usage_pct': bucket.usage,
+            'blocked_until': (datetime.fromtimestamp(bucket.blocked_until, timezone.utc)
+                              if bucket.blocked_until > now else None),
+            'updated_at': datetime.now(timezone.utc),
+        }
+        stmt = insert(RateLimitState.__table__).values(platform=group, bucket_key=key, **values)
+        stmt = stmt.on_conflict_do_update(index_elements=['platform', 'bucket_key'], set_=values)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception as e:
+            print(f'[RateLimit] could not write shared state: {e}')
+
+
+limiter = RateLimiter()
@@ -0,0 +1,179 @@
+"""Retries with jittered exponential backoff and per-platform circuit breakers.
+
+Every platform call made through http_client runs inside call(). Failures
+are classified as retryable or fatal:
+
+- connection failures before the request was sent are always retryable;
+  read timeouts only for idempotent methods;
+- 429 and Graph throttling errors were refused before any processing
+  and are retryable for any method;
+- 503, other 5xx and Graph errors Meta flags as transient or unknown
+  (codes 1/2) are retryable for idempotent methods only — they often come
+  back after a POST has already created the post or reply, so
+  non-idempotent writes rely on the publish ledger instead;
+- everything else (auth, validation, 4xx) is fatal and returned at once.
+
+Connection failures, timeouts and 5xx count against the platform's
+circuit breaker. After CIRCUIT_FAILURE_THRESHOLD consecutive failures the
+breaker opens and calls fail fast with CircuitOpenError for
+CIRCUIT_RESET_SECONDS; then a single trial call decides whether it closes
+again.
+"""
+import random
+import threading
+import time
+import requests
+from flask import current_app
+from app_package.services.rate_limit import retry_after_seconds
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+# Graph API throttling codes: the call was refused, not processed
+GRAPH_THROTTLING_CODES = frozenset({4, 17, 32, 613})
+# Graph API codes meaning "try again later" — possibly after the call took effect
+GRAPH_TRANSIENT_CODES = frozenset({1, 2, 341})
+
+
+class CircuitOpenError(Exception):
+    """The platform is failing; calls are short-circuited until the breaker resets."""
+
+
+class CircuitBreaker:
+    def __init__(self, platform):
+        self.platform = platform
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        config = current_app.config
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + config['CIRCUIT_RESET_SECONDS'] - time.monotonic()
+            if remaining > 0 or self.trial_in_flight:
+                raise CircuitOpenError(
+                    f'{self.platform} is unavailable, not retrying for {max(int(remaining), 1)}s')
+            self.trial_in_flight = True  # half-open: let one call through
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        """The call ended without telling us anything about the platform's health."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= current_app.config['CIRCUIT_FAILURE_THRESHOLD']:
+                if self.opened_at is None:
+                    print(f'[Resilience] {self.platform} circuit opened after {self.failures} failures')
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(platform):
+    with _breakers_lock:
+        if platform not in _breakers:
+            _breakers[platform] = CircuitBreaker(platform)
+        return _breakers[platform]
+
+
+def classify_exception(exc, method):
+    """Return (retryable, counts_as_outage) for a requests exception."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True, True
+    if isinstance(exc, requests.Timeout):
+        return method in IDEMPOTENT_METHODS, True
+    if isinstance(exc, requests.ConnectionError):
+        return method in IDEMPOTENT_METHODS or _never_sent(exc), True
+    return False, False
+
+
+def _never_sent(exc):
+    """True if the connection failed before any bytes of the request went out."""
+    text = repr(exc)
+    return any(marker in text for marker in (
+        'NewConnectionError', 'NameResolutionError', 'Failed to establish a new connection'))
+
+
+def _graph_error(resp):
+    try:
+        data = resp.json()
+    except ValueError:
+        return None
+    return data.get('error') if isinstance(data, dict) and isinstance(data.get('error'), dict) else None
+
+
+def classify_response(resp, method):
+    """Return (retryable, counts_as_outage) for a platform response."""
+    status = resp.status_code
+    outage = status >= 500
+    idempotent = method in IDEMPOTENT_METHODS
+    if status == 429:
+        return True, outage
+    error = _graph_error(resp) if status >= 400 else None
+    if error and error.get('code') in GRAPH_THROTTLING_CODES:
+        return True, outage
+    if error and (error.get('is_transient') or error.get('code') in GRAPH_TRANSIENT_CODES):
+        return idempotent, outage
+    if outage:
+        return idempotent, True
+    return False, False
+
+
+def backoff_delay(attempt, resp=None):
+    """Full-jitter exponential backoff, honouring a Retry-After header when given."""
+    config = current_app.config
+    cap = config['RETRY_MAX_DELAY']
+    retry_after = retry_after_seconds(resp.headers.get('Retry-After')) if resp is not None else None
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0, min(cap, config['RETRY_BASE_DELAY'] * 2 ** attempt))
+
+
+def call(platform, method, send):
+    """Run `send()` (one HTTP attempt) with retries under the platform's breaker.
+
+    Returns the final response — callers keep handling API errors as before —
+    or raises the final exception, or CircuitOpenError while the platform is down.
+    """
+    breaker = breaker_for(platform)
+    attempts = current_app.config['RETRY_MAX_ATTEMPTS']
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            resp = send()
+        except requests.RequestException as e:
+            retryable, outage = classify_exception(e, method)
+            if outage:
+                breaker.record_failure()
+            else:
+                breaker.release()
+            if not retryable or attempt == attempts - 1:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+        except Exception:
+            breaker.release()
+            raise
+
+        retryable, outage = classify_response(resp, method)
+        if outage:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if not retryable or attempt == attempts - 1:
+            return resp
+        print(f'[Resilience] {platform} {method} got {resp.status_code}, retrying')
+        time.sleep(backoff_delay(attempt, resp))
+    return resp
@@ -0,0 +1,156 @@
+"""Full-text search over comments (content, author) and post content.
+
+SQLite uses FTS5 tables (comments_fts, posts_fts) kept in sync with their
+source tables by triggers. Postgres uses a stored, generated tsvector
+column on each table with a GIN index. Either way new and edited rows are
+indexed as they are written, and a query is an index lookup ranked by
+relevance (bm25 / ts_rank).
+
+ensure_index() is called from create_app and is safe to run on every start.
+"""
+import re
+from markupsafe import escape
+from sqlalchemy import text
+from app_package import db
+
+KINDS = ('comments', 'posts')
+MAX_PER_PAGE = 100
+# Control characters the database wraps around matches instead of markup,
+# so snippets of user text are HTML-escaped first and then given <mark> tags.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+# Indexed text columns per source table; the first is weighted highest
+INDEXED_COLUMNS = {
+    'comments': ('content', 'author_name'),
+    'posts': ('content',),
+}
+
+_state = {'available': None}
+
+
+def _sqlite_statements(table, columns):
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        # Only edits to indexed text re-index the row (not status or timestamp
+        # updates); dropped first so indexes built with the broader trigger move over.
+        f'DROP TRIGGER IF EXISTS {fts}_au',
+        f'CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+    ]
+
+
+def _postgres_statements(table, columns):
+    weights = 'ABCD'
+    vector = ' || '.join(
+        f"setweight(to_tsvector('english', coalesce({c}, '')), '{weights[i]}')" for i, c in enumerate(columns))
+    return [
+        f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+        f'GENERATED ALWAYS AS ({vector}) STORED',
+        f'CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)',
+    ]
+
+
+def ensure_index():
+    """Create the search index structures (and build them the first time)."""
+    dialect = db.engine.dialect.name
+    try:
+        with db.engine.begin() as conn:
+            for table, columns in INDEXED_COLUMNS.items():
+                if dialect == 'postgresql':
+                    for statement in _postgres_statements(table, columns):
+                        conn.execute(text(statement))
+                    continue
+                is_new = not conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': f'{table}_fts'}).first()
+                for statement in _sqlite_statements(table, columns):
+                    conn.execute(text(statement))
+                if is_new:
+                    conn.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+        _state['available'] = True
+    except Exception as e:
+        # e.g. SQLite built without FTS5: search falls back to LIKE scans
+        print(f'[Search] full-text index unavailable: {e}')
+        _state['available'] = False
+
+
+def _fts5_query(query):
+    """Turn free text into an FTS5 query matching every word (quoted, so no syntax errors)."""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{w}"' for w in words)
+
+
+def _select(kind, dialect, available):
+    """SQL returning (id, score, snippet) rows for :q, best first, :limit/:offset paged."""
+    table = kind
+    if not available:
+        where = ' OR '.join(f"{c} LIKE '%' || :raw || '%'" for c in INDEXED_COLUMNS[kind])
+        return (f'SELECT id, 0 AS score, {INDEXED_COLUMNS[kind][0]} AS snippet FROM {table} '
+                f'WHERE {where} ORDER BY id DESC LIMIT :limit OFFSET :offset')
+    if dialect == 'postgresql':
+        return (
+            f"SELECT id, ts_rank(search_vector, query) AS score, "
+            f"ts_headline('english', coalesce(content, ''), query, "
+            f"'StartSel=' || :start || ', StopSel=' || :stop || ', MaxFragments=1, MaxWords=24, MinWords=8') "
+            f"AS snippet "
+            f"FROM {table}, websearch_to_tsquery('english', :q) AS query "
+            f"WHERE search_vector @@ query ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+        )
+    fts = f'{table}_fts'
+    return (
+        f"SELECT rowid AS id, -bm25({fts}) AS score, "
+        f"snippet({fts}, 0, :start, :stop, '…', 16) AS snippet "
+        f"FROM {fts} WHERE {fts} MATCH :q ORDER BY rank LIMIT :limit OFFSET :offset"
+    )
+
+
+def search(query, kind='comments', page=1, per_page=20):
+    """Ranked, paginated full-text search.
+
+    Returns {'hits': [{'id', 'score', 'snippet'}, ...], 'page', 'per_page',
+    'has_more'}; hits are ids of `kind` rows, best match first. Snippets
+    are HTML-escaped with matches wrapped in <mark>.
+    """
+    if kind not in KINDS:
+        raise ValueError(f'Unknown search kind: {kind}')
+    page = max(1, page)
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    result = {'hits': [], 'page': page, 'per_page': per_page, 'has_more': False}
+    dialect = db.engine.dialect.name
+    if _state['available'] is None:
+        ensure_index()
+    q = query.strip() if dialect == 'postgresql' else _fts5_query(query)
+    if not q:
+        return result
+
+    rows = db.session.execute(text(_select(kind, dialect, _state['available'])), {
+        'q': q,
+        'raw': query.strip(),
+        'limit': per_page + 1,
+        'offset': (page - 1) * per_page,
+        'start': HIGHLIGHT_START,
+        'stop': HIGHLIGHT_STOP,
+    }).all()
+    result['has_more'] = len(rows) > per_page
+    result['hits'] = [
+        {'id': row.id, 'score': float(row.score or 0), 'snippet': _highlight(row.snippet or '')}
+        for row in rows[:per_page]
+    ]
+    return result
+
+
+def _highlight(snippet):
+    """HTML-escape a snippet of user text, then mark its highlighted matches."""
+    return (str(escape(snippet))
+            .replace(HIGHLIGHT_START, '<mark>')
+            .replace(HIGHLIGHT_STOP, '</mark>'))
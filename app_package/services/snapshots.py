@@ -0,0 +1,156 @@
+"""Engagement time series: append-only snapshots of each post's counters.
+
+The metrics refresher appends a 'raw' EngagementSnapshot for every post it
+reads. Counters are cumulative, so a post's value over any span is its
+latest sample in that span. compact() (a scheduler job) uses that to keep
+the table small:
+
+- raw samples older than SNAPSHOT_RAW_HOURS become one 'hour' row per post
+  and hour: the hour's last sample, kept at the time it was captured,
+- hourly rows older than SNAPSHOT_HOURLY_DAYS become 'day' rows the same way,
+- daily rows older than SNAPSHOT_RETENTION_DAYS are deleted.
+
+Cutoffs are aligned to whole hours/days, so a bucket is only rolled up once
+it is complete, and each rollup replaces the rows it summarises in the same
+transaction: at any time every instant is covered by exactly one
+granularity and readers never need to pick one.
+"""
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import and_, func
+from app_package import db
+from app_package.models import EngagementSnapshot
+from app_package.services.sql import as_utc, insert
+
+COUNTERS = ('likes', 'comments', 'shares', 'impressions', 'reach')
+ENGAGEMENT = ('likes', 'comments', 'shares')
+# Snapshot rows per INSERT statement (SQLite allows 32766 bound parameters, 9 per row)
+INSERT_CHUNK = 500
+# Posts compacted per transaction
+COMPACT_CHUNK = 200
+
+
+def _floor(value, granularity):
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if granularity == 'day' else value
+
+
+def _insert(rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        stmt = insert(EngagementSnapshot.__table__).values(rows[start:start + INSERT_CHUNK])
+        db.session.execute(stmt.on_conflict_do_nothing(
+            index_elements=['post_result_id', 'granularity', 'captured_at']))
+
+
+def capture(rows, captured_at=None):
+    """Append raw snapshots; `rows` are dicts with post_result_id, social_account_id and counters."""
+    if not rows:
+        return
+    captured_at = captured_at or datetime.now(timezone.utc)
+    _insert([
+        dict({c: row.get(c) for c in COUNTERS}, post_result_id=row['post_result_id'],
+             social_account_id=row['social_account_id'], captured_at=captured_at, granularity='raw')
+        for row in rows
+    ])
+    db.session.commit()
+
+
+def _roll_up(source, target, cutoff):
+    """Replace `source` rows captured before `cutoff` with `target` rollups. Returns rows removed."""
+    post_ids = [pid for (pid,) in db.session.query(EngagementSnapshot.post_result_id).filter(
+        EngagementSnapshot.granularity == source,
+        EngagementSnapshot.captured_at < cutoff,
+    ).distinct()]
+    removed = 0
+    for start in range(0, len(post_ids), COMPACT_CHUNK):
+        chunk = post_ids[start:start + COMPACT_CHUNK]
+        rows = db.session.query(EngagementSnapshot).filter(
+            EngagementSnapshot.granularity == source,
+            EngagementSnapshot.captured_at < cutoff,
+            EngagementSnapshot.post_result_id.in_(chunk),
+        ).order_by(EngagementSnapshot.post_result_id, EngagementSnapshot.captured_at).all()
+        buckets = {}
+        for row in rows:  # ordered by time: the last sample of each bucket wins
+            captured_at = as_utc(row.captured_at)
+            buckets[(row.post_result_id, _floor(captured_at, target))] = dict(
+                {c: getattr(row, c) for c in COUNTERS}, post_result_id=row.post_result_id,
+                social_account_id=row.social_account_id, captured_at=captured_at, granularity=target)
+        _insert(list(buckets.values()))
+        removed += db.session.query(EngagementSnapshot).filter(
+            EngagementSnapshot.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        db.session.commit()
+    return removed
+
+
+def compact(now=None):
+    """Roll raw samples up to hours and hours up to days, and drop expired days.
+
+    Returns {'hour': raw rows compacted, 'day': hourly rows compacted, 'expired': daily rows deleted}.
+    """
+    config = current_app.config
+    now = now or datetime.now(timezone.utc)
+    outcome = {
+        'hour': _roll_up('raw', 'hour', _floor(now - timedelta(hours=config['SNAPSHOT_RAW_HOURS']), 'hour')),
+        'day': _roll_up('hour', 'day', _floor(now - timedelta(days=config['SNAPSHOT_HOURLY_DAYS']), 'day')),
+    }
+    outcome['expired'] = db.session.query(EngagementSnapshot).filter(
+        EngagementSnapshot.granularity == 'day',
+        EngagementSnapshot.captured_at < now - timedelta(days=config['SNAPSHOT_RETENTION_DAYS']),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    if any(outcome.values()):
+        print(f"[Snapshots] compacted {outcome['hour']} raw and {outcome['day']} hourly rows, "
+              f"expired {outcome['expired']} daily rows")
+    return outcome
+
+
+def account_series(account_id, start, end):
+    """Snapshots of an account's posts captured in [start, end), oldest first."""
+    return db.session.query(EngagementSnapshot).filter(
+        EngagementSnapshot.social_account_id == account_id,
+        EngagementSnapshot.captured_at >= start,
+        EngagementSnapshot.captured_at < end,
+    ).order_by(EngagementSnapshot.captured_at, EngagementSnapshot.id).all()
+
+
+def _latest_before(account_id, when):
+    """{post_result_id: snapshot} — each post's last snapshot captured before `when`."""
+    latest = db.session.query(
+        EngagementSnapshot.post_result_id,
+        func.max(EngagementSnapshot.captured_at).label('captured_at'),
+    ).filter(
+        EngagementSnapshot.social_account_id == account_id,
+        EngagementSnapshot.captured_at < when,
+    ).group_by(EngagementSnapshot.post_result_id).subquery()
+    rows = db.session.query(EngagementSnapshot).join(latest, and_(
+        EngagementSnapshot.post_result_id == latest.c.post_result_id,
+        EngagementSnapshot.captured_at == latest.c.captured_at,
+    )).filter(EngagementSnapshot.social_account_id == account_id).all()
+    return {row.post_result_id: row for row in rows}
+
+
+def _engagement(row):
+    return sum(getattr(row, c) or 0 for c in ENGAGEMENT)
+
+
+def engagement_gained(account_id, boundaries):
+    """Engagement (likes + comments + shares) the account's posts gained between consecutive boundaries.
+
+    A post's first snapshot is its baseline: what it had earned before it
+    was first read is not counted as gained. Reads one baseline per post
+    and then only the snapshots between the first and last boundary.
+    """
+    if not boundaries:
+        return []
+    current = {pid: _engagement(row) for pid, row in _latest_before(account_id, boundaries[0]).items()}
+    series = account_series(account_id, boundaries[0], boundaries[-1])
+    gained, i = [], 0
+    for when in boundaries[1:]:
+        total = 0
+        while i < len(series) and as_utc(series[i].captured_at) < when:
+            value = _engagement(series[i])
+            total += value - current.get(series[i].post_result_id, value)
+            current[series[i].post_result_id] = value
+            i += 1
+        gained.append(max(0, total))
+    return gained
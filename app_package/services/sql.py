@@ -0,0 +1,21 @@
+"""Dialect-aware SQL helpers shared by the services."""
+from datetime import timezone
+from app_package import db
+
+
+def insert(table):
+    """INSERT construct supporting on_conflict_do_nothing / on_conflict_do_update.
+
+    Postgres and SQLite both support ON CONFLICT, but through their own
+    dialect-specific insert().
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+
+def as_utc(value):
+    """SQLite hands back naive datetimes; everything stored is UTC."""
+    return value.replace(tzinfo=timezone.utc) if value and value.tzinfo is None else value
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,16 +18,29 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     # Upload
-    UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
-    MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10 MB
+    # Every process that publishes or reads media must see the same folder (see render.yaml)
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads'))
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_MB', 512)) * 1024 * 1024  # videos included
+    # Let the front proxy stream /uploads: '' (Flask serves), 'x-sendfile' or 'x-accel-redirect' (nginx)
+    UPLOADS_OFFLOAD = os.environ.get('UPLOADS_OFFLOAD', '').lower()
+    UPLOADS_ACCEL_PREFIX = os.environ.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+    USE_X_SENDFILE = UPLOADS_OFFLOAD == 'x-sendfile'
+    # Chunked video uploads — bytes per chunk held in memory, LinkedIn parts sent at once
+    VIDEO_CHUNK_BYTES = int(os.environ.get('VIDEO_CHUNK_BYTES', 8 * 1024 * 1024))
+    VIDEO_UPLOAD_CONCURRENCY = int(os.environ.get('VIDEO_UPLOAD_CONCURRENCY', 4))
+    # Unreferenced uploads are deleted once older than this (scheduler job, every MEDIA_GC_INTERVAL_SECONDS)
+    MEDIA_GC_GRACE_SECONDS = float(os.environ.get('MEDIA_GC_GRACE_SECONDS', 86400))
+    MEDIA_GC_INTERVAL_SECONDS = float(os.environ.get('MEDIA_GC_INTERVAL_SECONDS', 86400))
 
     # Meta (Facebook + Instagram)
     META_APP_ID = os.environ.get('META_APP_ID', '')
     META_APP_SECRET = os.environ.get('META_APP_SECRET', '')
+    META_WEBHOOK_VERIFY_TOKEN = os.environ.get('META_WEBHOOK_VERIFY_TOKEN', '')  # enables /webhooks/meta
 
     # LinkedIn
     LINKEDIN_CLIENT_ID = os.environ.get('LINKEDIN_CLIENT_ID', '')
     LINKEDIN_CLIENT_SECRET = os.environ.get('LINKEDIN_CLIENT_SECRET', '')
+    LINKEDIN_API_VERSION = os.environ.get('LINKEDIN_API_VERSION', '202501')  # /rest endpoints (video)
 
     # Base URL for OAuth redirects
     BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8090')
@@ -34,8 +48,61 @@ class Config:
     # OpenAI
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 
-    # Scheduler
+    # Scheduler (python -m scheduler)
     SCHEDULER_API_ENABLED = False
+    SCHEDULER_TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK_SECONDS', 60))  # liveness heartbeat
+    SCHEDULER_SAFETY_SECONDS = float(os.environ.get('SCHEDULER_SAFETY_SECONDS', 900))  # DB re-check
+    SCHEDULER_HEARTBEAT_FILE = os.environ.get(
+        'SCHEDULER_HEARTBEAT_FILE', os.path.join(tempfile.gettempdir(), 'bhouma-scheduler.heartbeat'))
+
+    # Publishing — max accounts published to concurrently per post
+    PUBLISH_MAX_WORKERS = int(os.environ.get('PUBLISH_MAX_WORKERS', 8))
+
+    # Comment sync — concurrent fetches in total, per platform and per access token
+    COMMENT_SYNC_MAX_WORKERS = int(os.environ.get('COMMENT_SYNC_MAX_WORKERS', 16))
+    COMMENT_SYNC_PER_PLATFORM = int(os.environ.get('COMMENT_SYNC_PER_PLATFORM', 8))
+    COMMENT_SYNC_PER_TOKEN = int(os.environ.get('COMMENT_SYNC_PER_TOKEN', 3))
+    COMMENT_SYNC_TICK_SECONDS = float(os.environ.get('COMMENT_SYNC_TICK_SECONDS', 60))  # background job
+    COMMENT_SYNC_MAX_POSTS = int(os.environ.get('COMMENT_SYNC_MAX_POSTS', 1000))  # posts synced per run
+    # With Meta webhooks on, Facebook/Instagram polling is only a fallback: poll this many times less often
+    COMMENT_SYNC_WEBHOOK_SLOWDOWN = float(os.environ.get('COMMENT_SYNC_WEBHOOK_SLOWDOWN', 6))
+
+    # Engagement metrics refresher — background job, posts per run, concurrent batches in total and per platform
+    METRICS_REFRESH_TICK_SECONDS = float(os.environ.get('METRICS_REFRESH_TICK_SECONDS', 300))
+    METRICS_REFRESH_MAX_POSTS = int(os.environ.get('METRICS_REFRESH_MAX_POSTS', 1000))
+    METRICS_REFRESH_MAX_WORKERS = int(os.environ.get('METRICS_REFRESH_MAX_WORKERS', 6))
+    METRICS_REFRESH_PER_PLATFORM = int(os.environ.get('METRICS_REFRESH_PER_PLATFORM', 3))
+
+    # Engagement snapshots — raw samples become hourly rollups after SNAPSHOT_RAW_HOURS, hourly become
+    # daily after SNAPSHOT_HOURLY_DAYS, daily are kept SNAPSHOT_RETENTION_DAYS (compaction job interval)
+    SNAPSHOT_RAW_HOURS = float(os.environ.get('SNAPSHOT_RAW_HOURS', 48))
+    SNAPSHOT_HOURLY_DAYS = float(os.environ.get('SNAPSHOT_HOURLY_DAYS', 30))
+    SNAPSHOT_RETENTION_DAYS = float(os.environ.get('SNAPSHOT_RETENTION_DAYS', 365))
+    SNAPSHOT_COMPACT_INTERVAL_SECONDS = float(os.environ.get('SNAPSHOT_COMPACT_INTERVAL_SECONDS', 3600))
+
+    # Outbound platform HTTP — pooled keep-alive sessions
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))  # hosts kept per platform
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 20))  # connections kept per host
+    HTTP_SLOW_CALL_SECONDS = float(os.environ.get('HTTP_SLOW_CALL_SECONDS', 10))
+
+    # Retries and circuit breakers for platform calls
+    RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', 3))
+    RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', 0.5))
+    RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', 8))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+    CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', 60))
+
+    # Platform rate limiting — slow down once Meta reports this % of quota used
+    RATE_LIMIT_SLOWDOWN_AT = float(os.environ.get('RATE_LIMIT_SLOWDOWN_AT', 75))
+    RATE_LIMIT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 30))
+    RATE_LIMIT_SYNC_SECONDS = float(os.environ.get('RATE_LIMIT_SYNC_SECONDS', 5))
+
+    # Publish job queue (worker.py)
+    WORKER_POLL_SECONDS = float(os.environ.get('WORKER_POLL_SECONDS', 2))
+    PUBLISH_JOB_MAX_ATTEMPTS = int(os.environ.get('PUBLISH_JOB_MAX_ATTEMPTS', 3))
+    PUBLISH_JOB_LEASE_SECONDS = int(os.environ.get('PUBLISH_JOB_LEASE_SECONDS', 120))
+    # Lease of in-flight publish ledger entries written outside a job (job entries follow the job lease)
+    PUBLISH_INFLIGHT_TIMEOUT_SECONDS = int(os.environ.get('PUBLISH_INFLIGHT_TIMEOUT_SECONDS', 900))
 
     # Share page URLs (for manual sharing)
     FACEBOOK_PAGE_URL = os.environ.get('FACEBOOK_PAGE_URL', 'https://www.facebook.com/bhoumaenvirotech/')
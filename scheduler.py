@@ -1,44 +1,268 @@
-"""APScheduler job definitions for scheduled posts."""
+"""APScheduler job definitions for scheduled posts.
+
+Scheduled posts are not polled: a one-shot job is armed for the earliest
+pending scheduled_at and re-armed whenever compose schedules a new post,
+with a slow safety re-check against the DB (SCHEDULER_SAFETY_SECONDS).
+
+In production this runs as its own process, on the host that stores
+uploads (media garbage collection scans UPLOAD_FOLDER; on Render start.sh
+runs it inside the web service):
+
+    python -m scheduler           # run the scheduler until SIGTERM/SIGINT
+    python -m scheduler --check   # liveness probe: exit 0 if the heartbeat is fresh
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 
 scheduler = BackgroundScheduler()
+# Delay before retrying due posts after publish_scheduled_posts() failed
+PUBLISH_RETRY_SECONDS = 30
+stop_event = threading.Event()
 
 
 def publish_scheduled_posts():
-    """Check for posts with status=scheduled and scheduled_at <= now, then publish them."""
+    """Claim posts with status=scheduled and scheduled_at <= now and queue them for the publish workers.
+
+    The claim and the enqueue commit together, and the claim skips rows another
+    scheduler replica already holds, so running several replicas never
+    publishes the same post twice.
+    """
     from app_package import db
     from app_package.models import Post
-    from app_package.routes.compose import publish_post
-
-    now = datetime.now(timezone.utc)
-    posts = db.session.query(Post).filter(
-        Post.status == 'scheduled',
-        Post.scheduled_at <= now,
-    ).all()
+    from app_package.services.claims import claim
+    from app_package.services.job_queue import enqueue_publish
+    from sqlalchemy import and_
 
-    for post in posts:
-        post.status = 'publishing'
+    batch = 50
+    while True:
+        now = datetime.now(timezone.utc)
+        post_ids = claim(
+            Post,
+            and_(Post.status == 'scheduled', Post.scheduled_at <= now),
+            {'status': 'publishing'},
+            order_by=(Post.scheduled_at, Post.id),
+            limit=batch,
+        )
+        for post_id in post_ids:
+            enqueue_publish(db.session.get(Post, post_id))
         db.session.commit()
-        try:
-            publish_post(post)
-        except Exception as e:
-            post.status = 'failed'
-            db.session.commit()
-            print(f'Scheduler: Failed to publish post {post.id}: {e}')
+        if len(post_ids) < batch:
+            break
 
 
-def init_scheduler(app):
-    """Initialize the scheduler with the Flask app context."""
-    def job_wrapper():
+def _touch_heartbeat(path):
+    """Record that the scheduler loop completed a tick (read by --check)."""
+    try:
+        with open(path, 'w') as f:
+            f.write(datetime.now(timezone.utc).isoformat())
+    except OSError as e:
+        print(f'Scheduler: could not write heartbeat {path}: {e}')
+
+
+def is_alive(heartbeat_file, tick_seconds):
+    """True if the heartbeat was written within the last three ticks."""
+    try:
+        age = time.time() - os.path.getmtime(heartbeat_file)
+    except OSError:
+        return False
+    return age < tick_seconds * 3
+
+
+def _arm(app, not_before=None):
+    """(Re)schedule the publish job for the earliest pending deadline (but not before `not_before`)."""
+    from app_package.services import deadlines
+
+    deadline = deadlines.next_deadline()
+    if deadline is None:
+        if scheduler.get_job('publish_due_posts'):
+            scheduler.remove_job('publish_due_posts')
+        return
+    scheduler.add_job(
+        func=_publish_due,
+        args=(app,),
+        trigger='date',
+        run_date=max(deadline, not_before) if not_before else deadline,
+        id='publish_due_posts',
+        replace_existing=True,
+        misfire_grace_time=None,
+    )
+
+
+def _publish_due(app):
+    from app_package.services import deadlines
+
+    not_before = None
+    popped = deadlines.pop_due(datetime.now(timezone.utc))
+    try:
         with app.app_context():
             publish_scheduled_posts()
+    except Exception as e:
+        # Keep the popped deadlines armed, and retry after a pause rather than in a tight loop
+        print(f'Scheduler: publishing due posts failed, retrying in {PUBLISH_RETRY_SECONDS}s: {e}')
+        deadlines.restore(popped)
+        not_before = datetime.now(timezone.utc) + timedelta(seconds=PUBLISH_RETRY_SECONDS)
+    finally:
+        _arm(app, not_before)
+
+
+def _safety_check(app):
+    """Reload deadlines from the DB in case a notification was missed."""
+    from app_package.services import deadlines
+
+    try:
+        with app.app_context():
+            deadlines.reload()
+            publish_scheduled_posts()
+    finally:
+        _arm(app)
+
+
+def _collect_media_garbage(app):
+    from app_package.services import media
+
+    with app.app_context():
+        media.collect_garbage()
+
+
+def _sync_comments(app):
+    from app_package.services import comment_sync
+    from app_package.services.claims import job_lock
+
+    # Only one scheduler process syncs at a time
+    with app.app_context(), job_lock('comment_sync') as acquired:
+        if acquired:
+            comment_sync.run_background_sync()
+
+
+def _refresh_metrics(app):
+    from app_package.services import metrics_refresh
+    from app_package.services.claims import job_lock
+
+    with app.app_context(), job_lock('metrics_refresh') as acquired:
+        if acquired:
+            metrics_refresh.run_refresh()
+
+
+def _compact_snapshots(app):
+    from app_package.services import snapshots
+    from app_package.services.claims import job_lock
+
+    # Two compactions at once would roll up the same rows
+    with app.app_context(), job_lock('snapshot_compaction') as acquired:
+        if acquired:
+            snapshots.compact()
 
+
+def init_scheduler(app):
+    """Initialize the scheduler with the Flask app context."""
+    from app_package.services import deadlines
+
+    heartbeat_file = app.config['SCHEDULER_HEARTBEAT_FILE']
+    deadlines.subscribe(lambda: _arm(app))
+
+    scheduler.add_job(
+        func=_safety_check,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config['SCHEDULER_SAFETY_SECONDS'],
+        next_run_time=datetime.now(timezone.utc),
+        id='publish_safety_check',
+        replace_existing=True,
+    )
     scheduler.add_job(
-        func=job_wrapper,
+        func=_sync_comments,
+        args=(app,),
         trigger='interval',
-        minutes=1,
-        id='publish_scheduled_posts',
+        seconds=app.config['COMMENT_SYNC_TICK_SECONDS'],
+        id='comment_sync',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        func=_refresh_metrics,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config['METRICS_REFRESH_TICK_SECONDS'],
+        id='metrics_refresh',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        func=_compact_snapshots,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config['SNAPSHOT_COMPACT_INTERVAL_SECONDS'],
+        id='snapshot_compaction',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        func=_collect_media_garbage,
+        args=(app,),
+        trigger='interval',
+        seconds=app.config['MEDIA_GC_INTERVAL_SECONDS'],
+        id='media_gc',
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        func=_touch_heartbeat,
+        args=(heartbeat_file,),
+        trigger='interval',
+        seconds=app.config['SCHEDULER_TICK_SECONDS'],
+        next_run_time=datetime.now(timezone.utc),
+        id='heartbeat',
         replace_existing=True,
     )
     scheduler.start()
+
+    # Postgres: wake up on NOTIFY from web processes scheduling new posts
+    with app.app_context():
+        from app_package import db
+        use_notify = db.engine.dialect.name == 'postgresql'
+    if use_notify:
+        def listen():
+            with app.app_context():
+                deadlines.listen(stop_event)
+        threading.Thread(target=listen, name='deadline-listener', daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Bhouma background scheduler.')
+    parser.add_argument('--check', action='store_true',
+                        help='exit 0 if a running scheduler has ticked recently, 1 otherwise')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        from config import Config
+        return 0 if is_alive(Config.SCHEDULER_HEARTBEAT_FILE, Config.SCHEDULER_TICK_SECONDS) else 1
+
+    from app_package import create_app
+    app = create_app()
+
+    def shutdown(signum, frame):
+        print(f'Scheduler: received signal {signum}, shutting down')
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    init_scheduler(app)
+    print(f'Scheduler: started (tick={app.config["SCHEDULER_TICK_SECONDS"]}s)')
+    while not stop_event.wait(1):
+        pass
+    scheduler.shutdown(wait=True)
+    print('Scheduler: stopped')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
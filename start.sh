@@ -0,0 +1,18 @@
+#!/usr/bin/env bash
+# Web service entry point on Render: gunicorn, the publish worker and the
+# scheduler on the same instance, so all of them see the uploads on the
+# service's persistent disk (Render disks can't be shared between
+# services). If any process exits the script exits too and Render
+# restarts the instance.
+set -o errexit
+
+# Forward Render's SIGTERM so the worker and scheduler shut down gracefully
+# (releasing their job leases) instead of being killed with the shell.
+trap 'kill -TERM $(jobs -p) 2>/dev/null; wait' TERM INT
+
+python worker.py &
+python -m scheduler &
+gunicorn app:app --bind 0.0.0.0:"${PORT:-8090}" &
+
+wait -n
+exit $?
@@ -0,0 +1,49 @@
+"""Publish worker process — claims queued publish jobs and runs them.
+
+Run one or more of these alongside the web process:
+
+    python worker.py
+
+Workers read post media from UPLOAD_FOLDER, so they must run where the
+web process stores uploads (same host, or the same mounted disk). On
+Render, start.sh runs the worker inside the web service for that reason.
+"""
+import signal
+import threading
+
+stop_event = threading.Event()
+
+
+def start_worker_thread(app):
+    """Run the job loop in a daemon thread (used by the dev server)."""
+    def run():
+        from app_package.services.job_queue import work
+        with app.app_context():
+            work(stop=stop_event)
+
+    thread = threading.Thread(target=run, name='publish-worker', daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    from app_package import create_app
+    from app_package.services.job_queue import work, worker_id
+
+    app = create_app()
+
+    def shutdown(signum, frame):
+        print(f'Worker: received signal {signum}, finishing current job')
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    print(f'Worker: {worker_id()} started')
+    with app.app_context():
+        work(stop=stop_event)
+    print('Worker: stopped')
+
+
+if __name__ == '__main__':
+    main()